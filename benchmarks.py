@@ -0,0 +1,191 @@
+# offline benchmark suite for the simulation loop, runnable on machines without model access
+#
+#   python benchmarks.py                          # print results
+#   python benchmarks.py --output bench.json      # save results as a baseline
+#   python benchmarks.py --baseline bench.json    # exit 1 if anything regressed past --tolerance
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# never reach for the network: every board uses the local mock pilot
+os.environ.setdefault('LLM_PILOT_BACKEND', 'mock')
+
+ORDER = 'Advance with care, use the groves for cover and fire only when you have a clear shot.'
+SAMPLE_ACTIONS = ['move forward 50 m', 'Turn left 30 degrees.', 'Action: turn right 45', 'Fire!', 'move back 20 meters',
+                  'I will advance 0.04 km toward the grove.', 'Rotate counter-clockwise by 15 deg', 'hold position']
+
+
+def measure(func, min_seconds=0.5):
+    # calls per second of func(), repeated for at least min_seconds
+    n = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        func()
+        n += 1
+        elapsed = time.perf_counter() - start
+    return n/elapsed
+
+
+def bench_parsing(sim, min_seconds):
+    from llm_pilot.action_parser import parse_action
+    uncached = parse_action.__wrapped__
+    actions = SAMPLE_ACTIONS
+
+    def parse_all_uncached():
+        for action in actions:
+            uncached(action)
+
+    def parse_all_cached():
+        for action in actions:
+            parse_action(action)
+    return {'parse_uncached_per_s': (measure(parse_all_uncached, min_seconds)*len(actions), 'ops/s', True),
+            'parse_cached_per_s': (measure(parse_all_cached, min_seconds)*len(actions), 'ops/s', True)}
+
+
+def bench_physics(sim, min_seconds):
+    from llm_pilot.batch_physics import BatchWorld, ACTION_MOVE, ACTION_TURN
+    tank = sim.Tank('blue')
+    actions = [sim.parse_action(a) for a in ('turn left 10 degrees', 'move forward 1 m', 'turn right 10 degrees',
+                                             'move back 1 m')]
+
+    def scalar_steps():
+        for action in actions:
+            tank.update_status(action)
+    world = BatchWorld.random(1000, rng=0)
+    kind = np.where(np.arange(2000).reshape(1000, 2) % 2 == 0, ACTION_TURN, ACTION_MOVE)
+    value = np.zeros((1000, 2))
+
+    def batch_step():
+        world.step(kind, value)
+    return {'scalar_tank_steps_per_s': (measure(scalar_steps, min_seconds)*len(actions), 'ops/s', True),
+            'batch_tank_steps_per_s': (measure(batch_step, min_seconds)*world.n_boards*world.n_tanks, 'ops/s', True)}
+
+
+def bench_observation(sim, min_seconds):
+    board = sim.SimulationBoard(ORDER, ORDER, seed=0, render_every=0, write_trace=False)
+
+    def observe():
+        board.get_observation(board.blue_tank)
+        board.get_observation(board.red_tank)
+    result = {'observations_per_s': (measure(observe, min_seconds)*2, 'ops/s', True)}
+    board.close()
+    # a 16 vs 16 team battle, every tank observing at once
+    board = sim.SimulationBoard(ORDER, ORDER, seed=0, render_every=0, write_trace=False, n_blue=16, n_red=16)
+    result['team_observations_per_s'] = (measure(lambda: board.get_observations(board.tanks), min_seconds)*32,
+                                         'ops/s', True)
+    board.close()
+    return result
+
+
+def bench_fork(sim, min_seconds):
+    # snapshot a game 20 turns in and fork it, as a rollout does for every branch
+    board = sim.SimulationBoard(ORDER, ORDER, seed=0, render_every=0)
+    board.play_game(n_turns=20, verbose=False)
+
+    def fork():
+        board.fork().close()
+    return {'forks_per_s': (measure(fork, min_seconds), 'ops/s', True)}
+
+
+def bench_rendering(sim, min_seconds):
+    from llm_pilot.board_render import BoardRenderer, BoardSnapshot, TankSnapshot
+    board = sim.SimulationBoard(ORDER, ORDER, seed=0, render_every=0, write_trace=False)
+    renderer = BoardRenderer(board.grove_xy, board.grove_r, board.board_limits)
+    snapshot = BoardSnapshot(0, (TankSnapshot(0, 490, 180, 500, 90, 'b', True, False),
+                                 TankSnapshot(0, -490, 0, 500, 90, 'r')))
+    path = os.path.join(board.save_folder, 'bench.png')
+    result = {'render_frames_per_s': (measure(lambda: renderer.save(snapshot, path, dpi=72), min_seconds),
+                                      'frames/s', True)}
+    board.close()
+    return result
+
+
+def bench_game_loop(sim, n_games):
+    # full games against the mock pilot, including traces but without images
+    turns = 0
+    peaks = []
+    start = time.perf_counter()
+    for seed in range(n_games):
+        tracemalloc.start()
+        board = sim.SimulationBoard(ORDER, ORDER, seed=seed, render_every=0)
+        board.play_game(n_turns=50, verbose=False)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        turns += board.step_num
+    elapsed = time.perf_counter() - start
+    return {'turns_per_s': (turns/elapsed, 'turns/s', True),
+            'games_per_hour': (n_games/elapsed*3600, 'games/h', True),
+            'peak_memory_per_game_kib': (float(np.mean(peaks))/1024, 'KiB', False)}
+
+
+def run(quick=False) -> dict:
+    min_seconds = 0.2 if quick else 1.0
+    n_games = 3 if quick else 10
+    workdir = tempfile.mkdtemp(prefix='llm_pilot_bench_')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir) # game folders and traces stay out of the repo
+    from llm_pilot import simulation as sim
+    results = {}
+    for bench in (bench_parsing, bench_physics, bench_observation, bench_fork, bench_rendering):
+        results.update(bench(sim, min_seconds))
+    results.update(bench_game_loop(sim, n_games))
+    return {name: {'value': value, 'unit': unit, 'higher_is_better': higher}
+            for name, (value, unit, higher) in results.items()}
+
+
+def compare(results, baseline, tolerance) -> list:
+    # names of benchmarks that got worse than the baseline by more than tolerance (a fraction)
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]['value']
+        if result['higher_is_better']:
+            worse = result['value'] < reference*(1 - tolerance)
+        else:
+            worse = result['value'] > reference*(1 + tolerance)
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the tank pilot simulation.')
+    parser.add_argument('--quick', action='store_true', help='shorter runs, e.g. for CI')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results previously saved with --output')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed fractional regression (default 0.25)')
+    args = parser.parse_args(argv)
+    output = None if args.output is None else os.path.abspath(args.output)
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run(args.quick)
+    for name, result in results.items():
+        line = '{:28s} {:14.1f} {}'.format(name, result['value'], result['unit'])
+        if baseline is not None and name in baseline:
+            line += '   (baseline {:.1f})'.format(baseline[name]['value'])
+        print(line)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\nRegressed by more than {:.0%}: {}'.format(args.tolerance, ', '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""LLM-piloted tank battles: the simulation board, a tournament runner and their supporting tools.
+
+Submodules load on first use, so ``from llm_pilot import SimulationBoard`` is cheap: no model
+calls are made and dspy and matplotlib are only imported once a pilot is asked for an action or
+a board is drawn. Run tournaments from the command line with ``python -m llm_pilot``.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'Tank': 'simulation',
+    'SimulationBoard': 'simulation',
+    'BoardState': 'simulation',
+    'order_text': 'simulation',
+    'TournamentCheckpoint': 'tournament',
+    'run_tournament': 'tournament',
+    'print_tournament_summary': 'tournament',
+    'rollout': 'rollout',
+    'explore_actions': 'rollout',
+    'captain_orders': 'captain',
+    'Action': 'action_parser',
+    'parse_action': 'action_parser',
+    'build_lm': 'backends',
+    'make_lm': 'backends',
+    'register_backend': 'backends',
+    'MockPilotLM': 'backends',
+    'ResponseCache': 'llm_cache',
+    'MetricsRegistry': 'metrics',
+    'RenderPipeline': 'board_render',
+    'TraceReader': 'game_trace',
+    'RetryPolicy': 'resilience',
+    'TokenBucket': 'resilience',
+    'BatchWorld': 'batch_physics',
+    'ObstacleGrid': 'spatial_index',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module('.' + _EXPORTS[name], __name__), name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,134 @@
+# rule-based parser turning free-text tank pilot output into structured actions
+
+import functools
+import re
+from typing import NamedTuple
+
+from .batch_physics import ACTION_TURN, ACTION_MOVE, ACTION_FIRE, ACTION_UNKNOWN
+
+MAX_TURN = 45 # degrees per turn
+MAX_MOVE = 50 # meters per turn
+DEFAULT_MAGNITUDE = 50 # used when the pilot gives no number, as before (turns clamp it to 45)
+
+# canonical action forms, shown to the model in constrained-output mode
+ACTION_GRAMMAR = ("Reply with exactly one action and nothing else, in one of these forms: "
+                  "'turn left N degrees', 'turn right N degrees' (N from 0 to {}), "
+                  "'move forward N m', 'move back N m' (N from 0 to {}), or 'fire'.").format(MAX_TURN, MAX_MOVE)
+
+_TURN = re.compile(r'\b(?:turn|rotate|pivot|steer|veer|swing)(?:s|ed|ing)?\b')
+_LEFT = re.compile(r'\b(?:counter-?clockwise|anti-?clockwise|left|port)\b')
+_RIGHT = re.compile(r'\b(?:clockwise|right|starboard)\b')
+_MOVE = re.compile(r'\b(?:move|drive|go|roll|proceed|head|charge|creep|advance|retreat|reverse|back up)(?:s|d|ed|ing)?\b')
+_FORWARD = re.compile(r'\b(?:forwards?|ahead|onwards?|advance[sd]?|advancing)\b')
+_BACK = re.compile(r'\b(?:back(?:wards?)?|reverse[sd]?|reversing|retreat(?:s|ed|ing)?)\b')
+_FIRE = re.compile(r'\b(?:fir(?:e|es|ed|ing)|shoot(?:s|ing)?|shot)\b')
+_HOLD_FIRE = re.compile(r"\b(?:hold|cease|stop|don'?t|do not|never)\s+(?:your\s+)?(?:fire|firing|shooting|shoot)\b")
+# the number may not stop short of more digits, so '25th' is not read as 2
+_QUANTITY = re.compile(r'([-+−]?\d+(?:\.\d+)?)(?!\.?\d)\s*'
+                       r'(degrees?|degs?|°|kilomet(?:er|re)s?|km|met(?:er|re)s?|m|yards?|yds?|feet|foot|ft)?(?![a-z])')
+# end of a sentence or line in streamed output; a period only counts once whitespace follows ('0.5 km')
+_ACTION_END = re.compile(r'[!?;]|\.(?=\s)|(?=\n)')
+_UNIT_METERS = {'km': 1000.0, 'kilometer': 1000.0, 'kilometre': 1000.0, 'yard': 0.9144, 'yd': 0.9144,
+                'feet': 0.3048, 'foot': 0.3048, 'ft': 0.3048}
+
+
+class Action(NamedTuple):
+    """A parsed pilot action.
+
+    ``kind`` is 'turn', 'move', 'fire' or 'unknown'. ``magnitude`` is the number the pilot asked
+    for (degrees or meters, before clamping). ``value`` is what gets applied: signed and
+    clamped, with positive meaning turn right / move forward.
+    """
+    kind: str
+    magnitude: float = 0.0
+    value: float = 0.0
+
+    @property
+    def code(self) -> int:
+        # ACTION_* code used by batch_physics.BatchWorld.step
+        return _KIND_CODES[self.kind]
+
+    def canonical(self) -> str:
+        if self.kind == 'turn':
+            return 'turn {} {:g} degrees'.format('right' if self.value >= 0 else 'left', abs(self.value))
+        if self.kind == 'move':
+            return 'move {} {:g} m'.format('forward' if self.value >= 0 else 'back', abs(self.value))
+        return self.kind
+
+
+_KIND_CODES = {'turn': ACTION_TURN, 'move': ACTION_MOVE, 'fire': ACTION_FIRE, 'unknown': ACTION_UNKNOWN}
+UNKNOWN = Action('unknown')
+FIRE = Action('fire')
+
+
+def _first_match(pattern, text, start):
+    # earliest match at or after start, falling back to anywhere in the text
+    return pattern.search(text, start) or pattern.search(text)
+
+
+def _quantity(text, start, to_meters=False):
+    # number (and unit) following the action verb, otherwise the first number anywhere
+    match = _first_match(_QUANTITY, text, start)
+    if match is None:
+        return float(DEFAULT_MAGNITUDE)
+    num = float(match.group(1).replace('−', '-'))
+    unit = match.group(2)
+    if to_meters and unit:
+        num *= _UNIT_METERS.get(unit, _UNIT_METERS.get(unit.rstrip('s'), 1.0))
+    return num
+
+
+def _pick(first, second, start):
+    # of two direction matches, prefer the one closest after the verb
+    if first is None or second is None:
+        return first or second
+    after = [m for m in (first, second) if m.start() >= start]
+    if len(after) == 1:
+        return after[0]
+    return min((first, second), key=lambda m: m.start())
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_action(action) -> Action:
+    """Parse pilot output such as 'Turn left 30 degrees.' into an Action.
+
+    Turning takes precedence over moving and moving over firing, as in the original keyword
+    checks. A negative number reverses the direction (e.g. 'turn left -20' turns right 20
+    degrees). Results are memoized since models repeat themselves a lot.
+    """
+    text = action.lower()
+    turn = _TURN.search(text)
+    if turn is not None:
+        left = _first_match(_LEFT, text, turn.end())
+        right = _first_match(_RIGHT, text, turn.end())
+        direction = _pick(left, right, turn.end())
+        if direction is not None:
+            num = _quantity(text, turn.end())
+            sign = -1.0 if direction is left else 1.0
+            value = sign*float(min(abs(num), MAX_TURN))*(-1.0 if num < 0 else 1.0)
+            return Action('turn', abs(num), value)
+    move = _MOVE.search(text)
+    if move is not None:
+        forward = _first_match(_FORWARD, text, move.start())
+        back = _first_match(_BACK, text, move.start())
+        direction = _pick(forward, back, move.start())
+        if direction is not None:
+            num = _quantity(text, move.end(), to_meters=True)
+            sign = -1.0 if direction is back else 1.0
+            value = sign*float(min(abs(num), MAX_MOVE))*(-1.0 if num < 0 else 1.0)
+            return Action('move', abs(num), value)
+    if _FIRE.search(text) is not None and _HOLD_FIRE.search(text) is None:
+        return FIRE
+    return UNKNOWN
+
+
+def action_end(text):
+    """Length of the shortest prefix of streamed pilot output that holds a complete action, or None.
+
+    A prefix counts once it ends a sentence or line, so 'move forward 5' is not cut short of
+    'move forward 50 m.' while the model is still writing it.
+    """
+    for end in _ACTION_END.finditer(text):
+        if parse_action(text[:end.end()]).kind != 'unknown':
+            return end.end()
+    return None
@@ -0,0 +1,295 @@
+# pluggable LM backends, including a deterministic local stand-in pilot for offline runs
+
+import contextlib
+import os
+import random
+import re
+import threading
+import time
+import zlib
+
+from .llm_cache import CachedLM
+from .metrics import InstrumentedLM
+from .resilience import DEFAULT_RETRY_POLICY, ResilientLM, ensure_http_pool
+
+_ENEMY = re.compile(r'You see (?:the|an) enemy tank (\d+) m away, (in front of you|behind you|at (\d+) degrees to your (left|right))')
+_RIVER = re.compile(r'There is an impassible river (\d+) m away, (in front of you|at (\d+) degrees to your (left|right))')
+_STATUS = 'Here is the current battlefield status.'
+_ASK = 'Please take one of the above possible actions now.' # closes every observation, the opening one included
+
+CAPTAIN_ORDER = ('Pilot, the enemy waits somewhere beyond the fog. Use the groves for cover, close the distance '
+                 'carefully and only fire when you have a clear shot. Victory is ours to take.')
+DEBRIEF = 'I kept to cover where I could and fired when the enemy was in front of me.'
+_PIECE = re.compile(r'\s*\S+') # streamed mock tokens, one word each
+
+# per-thread stop condition for streamed completions (see stream_until)
+_streaming = threading.local()
+
+
+@contextlib.contextmanager
+def stream_until(stop):
+    """Stream the completions requested from this thread within the block and stop generating
+    as soon as ``stop(text so far)`` returns the length of text to keep (None keeps going).
+
+    CachedLM keys streamed completions on the stop condition's name, apart from whole ones.
+    ``stop=None`` turns streaming off; backends that cannot stream ignore it.
+    """
+    previous = getattr(_streaming, 'stop', None)
+    _streaming.stop = stop
+    try:
+        yield
+    finally:
+        _streaming.stop = previous
+
+
+def streaming_stop():
+    # stop condition set by stream_until in the calling thread, if any
+    return getattr(_streaming, 'stop', None)
+
+
+class MockServerError(Exception):
+    """Simulated server failure raised by MockPilotLM at its configured error rate."""
+
+    def __init__(self, message='simulated server error', http_status=503) -> None:
+        super().__init__(message)
+        self.http_status = http_status
+
+
+def scripted_policy(script):
+    # cycle through a fixed list of actions, one per pilot call, with a cursor per tank (keyed on its prompt header)
+    # so tanks sharing a board follow the script the same way whatever order their calls arrive in
+    lock = threading.Lock()
+    positions = {}
+
+    def policy(observation, rng, header=''):
+        with lock:
+            position = positions.get(header, 0)
+            positions[header] = position + 1
+        return script[position % len(script)]
+    return policy
+
+
+def heuristic_policy(observation, rng, header=''):
+    """Turn toward the nearest visible enemy and fire when lined up and in range; otherwise explore away from the river."""
+    enemy = _ENEMY.search(observation)
+    if enemy is not None:
+        dist = int(enemy.group(1))
+        if enemy.group(2) == 'behind you':
+            return 'turn right 45 degrees'
+        angle = 0 if enemy.group(3) is None else int(enemy.group(3))
+        if dist*angle > 1000:
+            return 'turn {} {} degrees'.format(enemy.group(4), min(angle, 45))
+        if dist > 400:
+            return 'move forward {} m'.format(min(dist - 390, 50))
+        return 'fire'
+    for river in _RIVER.finditer(observation):
+        angle = 0 if river.group(3) is None else int(river.group(3))
+        if int(river.group(1)) < 80 and angle < 60:
+            return 'turn right 45 degrees'
+    if rng.random() < 0.25:
+        return 'turn {} {} degrees'.format(rng.choice(['left', 'right']), rng.randint(10, 45))
+    return 'move forward 50 m'
+
+
+class MockPilotLM:
+    """Local stand-in for a dspy LM that never touches the network.
+
+    Pilot prompts are answered by ``policy(latest observation, rng, header)`` (heuristic by default,
+    or scripted), where ``header`` is the prompt up to the opening observation and so tells the
+    tanks apart; captain prompts get a canned order and debrief prompts a canned summary. The
+    random generator is seeded from ``seed`` and the prompt, so answers are deterministic
+    regardless of call order or threading. ``latency`` (seconds, with +/- ``latency_jitter``)
+    and ``error_rate`` (fraction of calls raising MockServerError) simulate a remote server.
+    Answers are generated a word at a time, ``token_latency`` seconds each and at most
+    ``max_tokens`` words, and stop early under stream_until.
+    """
+
+    def __init__(self, model='mock-pilot', temperature=0.0, policy=None, seed=0, latency=0.0, latency_jitter=0.0,
+                 error_rate=0.0, token_latency=0.0, **kwargs) -> None:
+        self.kwargs = {'model': model, 'temperature': temperature, 'max_tokens': 150, 'top_p': 1,
+                       'frequency_penalty': 0, 'presence_penalty': 0, 'n': 1, **kwargs}
+        self.provider = 'mock'
+        self.policy = heuristic_policy if policy is None else policy
+        self.seed = seed
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.token_latency = token_latency
+        # latency and failures are drawn apart from the answers, so they never change what the pilot says
+        # and a retried request can succeed
+        self.server_rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.history = []
+
+    def respond(self, prompt, rng) -> str:
+        if 'Directive:' in prompt:
+            return CAPTAIN_ORDER
+        if 'Please tell your Captain' in prompt:
+            return DEBRIEF
+        start = prompt.rfind(_STATUS)
+        observation = prompt[start:] if start >= 0 else prompt
+        first = prompt.find(_ASK)
+        header = prompt[:first + len(_ASK)] if first >= 0 else ''
+        return self.policy(observation, rng, header)
+
+    def generate(self, completion, max_tokens, stop) -> str:
+        # emit the answer word by word, as a streaming server would, until stop has what it needs
+        text = ''
+        for piece in _PIECE.findall(completion)[:max_tokens]:
+            if self.token_latency > 0:
+                time.sleep(self.token_latency)
+            text += piece
+            end = None if stop is None else stop(text)
+            if end is not None:
+                return text[:end]
+        return text
+
+    def basic_request(self, prompt, **kwargs):
+        request = {**self.kwargs, **kwargs}
+        rng = random.Random(zlib.crc32(prompt.encode('utf-8')) ^ self.seed ^ zlib.crc32(repr(request['temperature']).encode()))
+        with self.lock:
+            delay = self.latency + self.server_rng.uniform(-self.latency_jitter, self.latency_jitter)
+            failed = self.server_rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise MockServerError()
+        stop = streaming_stop()
+        completions = [self.generate(self.respond(prompt, rng), request['max_tokens'], stop)
+                       for _ in range(request.get('n', 1))]
+        self.history.append({'prompt': prompt, 'response': completions, 'kwargs': request})
+        return completions
+
+    def request(self, prompt, **kwargs):
+        return self.basic_request(prompt, **kwargs)
+
+    def __call__(self, prompt, only_completed=True, return_sorted=False, **kwargs):
+        return self.request(prompt, **kwargs)
+
+    def copy(self, **kwargs):
+        kwargs = {**self.kwargs, **kwargs}
+        return MockPilotLM(policy=self.policy, seed=self.seed, latency=self.latency,
+                           latency_jitter=self.latency_jitter, error_rate=self.error_rate,
+                           token_latency=self.token_latency, **kwargs)
+
+    def inspect_history(self, n=1):
+        for entry in self.history[-n:]:
+            print(entry['prompt'] + ' ' + entry['response'][0])
+
+
+_openai_class = None
+
+
+def _openai_stream(lm, prompt, stop, **kwargs):
+    # dsp caches whole responses, which a stream cannot be, so streamed requests go straight to the client;
+    # the stream is closed (ending generation) once every choice has a complete answer
+    import openai
+    request = {**lm.kwargs, **kwargs, 'stream': True}
+    chat = lm.model_type == 'chat'
+    if chat:
+        request['messages'] = [{'role': 'user', 'content': prompt}]
+        stream = openai.chat.completions.create(**request)
+    else:
+        request['prompt'] = prompt
+        stream = openai.completions.create(**request)
+    texts = {}
+    finish_reasons = {}
+    try:
+        for chunk in stream:
+            for choice in chunk.choices:
+                if choice.index in finish_reasons:
+                    continue
+                delta = choice.delta.content if chat else choice.text
+                text = texts.get(choice.index, '') + (delta or '')
+                end = stop(text)
+                if end is not None:
+                    text = text[:end]
+                    finish_reasons[choice.index] = 'stop'
+                elif choice.finish_reason is not None:
+                    finish_reasons[choice.index] = choice.finish_reason
+                texts[choice.index] = text
+            if len(finish_reasons) == request.get('n', 1):
+                break
+    finally:
+        stream.close()
+    choices = []
+    for index in sorted(texts):
+        choice = {'index': index, 'finish_reason': finish_reasons.get(index, 'stop')}
+        if chat:
+            choice['message'] = {'role': 'assistant', 'content': texts[index]}
+        else:
+            choice['text'] = texts[index]
+        choices.append(choice)
+    response = {'choices': choices}
+    lm.history.append({'prompt': prompt, 'response': response, 'kwargs': request, 'raw_kwargs': kwargs})
+    return response
+
+
+def _openai_backend(model='gpt-3.5-turbo', temperature=0.0, **kwargs):
+    global _openai_class
+    ensure_http_pool()
+    if _openai_class is None:
+        import dspy
+        import openai
+
+        class OpenAIPilotLM(dspy.OpenAI):
+            # no dsp built-in backoff (up to 1000 s per request): ResilientLM owns retries and game deadlines
+            def request(self, prompt, **kwargs):
+                kwargs.pop('model_type', None)
+                return self.basic_request(prompt, **kwargs)
+
+            def basic_request(self, prompt, **kwargs):
+                # streamed under stream_until (with the openai>=1 client), so generation stops at the first full answer
+                stop = streaming_stop()
+                if stop is None or not hasattr(openai, 'OpenAI'):
+                    return super().basic_request(prompt, **kwargs)
+                return _openai_stream(self, prompt, stop, **kwargs)
+        _openai_class = OpenAIPilotLM
+    return _openai_class(model=model, temperature=temperature, **kwargs)
+
+
+def _mock_backend(model='gpt-3.5-turbo', temperature=0.0, **kwargs):
+    return MockPilotLM(model='mock-pilot', temperature=temperature, **kwargs)
+
+
+def _scripted_backend(model='gpt-3.5-turbo', temperature=0.0, script=('move forward 50 m', 'turn left 30 degrees',
+                                                                        'fire'), **kwargs):
+    return MockPilotLM(model='mock-scripted', temperature=temperature, policy=scripted_policy(list(script)), **kwargs)
+
+
+BACKENDS = {
+    'openai': _openai_backend,
+    'mock': _mock_backend,
+    'scripted': _scripted_backend,
+}
+
+
+def register_backend(name, factory) -> None:
+    # factory(model=..., temperature=..., **options) -> dspy-compatible LM
+    BACKENDS[name] = factory
+
+
+def make_lm(backend='openai', model='gpt-3.5-turbo', temperature=0.0, **options):
+    """Build the LM for ``backend`` ('openai', 'mock', 'scripted' or a registered name)."""
+    if backend not in BACKENDS:
+        raise ValueError('unknown LM backend {!r}, expected one of {}'.format(backend, sorted(BACKENDS)))
+    return BACKENDS[backend](model=model, temperature=temperature, **options)
+
+
+def default_backend() -> str:
+    # 'openai' unless LLM_PILOT_BACKEND says otherwise (e.g. LLM_PILOT_BACKEND=mock on CI machines)
+    return os.environ.get('LLM_PILOT_BACKEND', 'openai')
+
+
+def build_lm(backend, temperature, metrics, cache=None, retry_policy=None, **options):
+    """Backend LM, retried on transient errors, instrumented and served from ``cache`` when given.
+
+    The cache sits outside the instrumentation, so cache hits are counted as such and never as
+    LM requests. Returns the LM to hand to dspy and its ResilientLM layer (whose ``deadline``
+    boards set).
+    """
+    resilient = ResilientLM(make_lm(default_backend() if backend is None else backend, model='gpt-3.5-turbo',
+                                    temperature=temperature, **options),
+                            DEFAULT_RETRY_POLICY if retry_policy is None else retry_policy, metrics)
+    lm = InstrumentedLM(resilient, metrics)
+    return (lm if cache is None else CachedLM(lm, cache, metrics)), resilient
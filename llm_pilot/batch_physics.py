@@ -0,0 +1,221 @@
+# structure-of-arrays tank physics for many boards at once, for scripted or replayed policies
+
+import numpy as np
+
+# action kinds accepted by BatchWorld.step; values are signed (turn left and move back are negative)
+ACTION_IDLE = 0 # tank does not act this step
+ACTION_TURN = 1 # degrees, clamped to +/- 45
+ACTION_MOVE = 2 # meters, clamped to +/- 50
+ACTION_FIRE = 3
+ACTION_UNKNOWN = 4 # tank acted but the action was not understood
+
+# per-tank outcome of ACTION_FIRE, matching the messages of SimulationBoard.check_fire_hit
+FIRE_NONE = 0
+FIRE_MISS = 1
+FIRE_SHORT = 2
+FIRE_HIT = 3
+FIRE_BLOCKED = 4 # shot stopped by an obstacle (SimulationBoard only; BatchWorld has no blocking obstacles)
+
+BLUE = 0
+RED = 1
+NO_WINNER = -1
+DRAW = -2
+
+
+class BatchWorld:
+    """Positions, headings, viewing cones and groves for ``n_boards`` boards in NumPy arrays.
+
+    Arrays are indexed [board, tank] (and [board, tank, other tank] or [board, tank, grove] for
+    pairwise quantities). Every query and ``step`` runs as a single vectorized pass over all
+    boards, using the same geometry as Tank and SimulationBoard: headings in degrees with
+    0 = North (+y) and 90 = East (+x), shots that hit within 400 m when
+    distance * angle error <= 1000, and a tank that becomes hidden (and stays hidden) once it
+    observes itself inside a grove within its viewing cone. As on a team SimulationBoard, a hit
+    destroys the nearest lined-up enemy, destroyed tanks stop acting and being seen, and a
+    board is decided once one side (or both) has no tanks left. Groves are padded to the
+    largest count with ``grove_mask`` marking the real ones.
+    """
+
+    def __init__(self, pos, heading, team, grove_xy, grove_r, grove_mask=None, board_limits=(-500, 500, -500, 500),
+                 viewing_radius=500.0, viewing_hwidth=90.0) -> None:
+        self.pos = np.array(pos, dtype=float) # (B, T, 2)
+        self.heading = np.array(heading, dtype=float) # (B, T)
+        self.team = np.broadcast_to(np.asarray(team, dtype=np.int8), self.heading.shape).copy() # (B, T)
+        self.viewing_radius = np.broadcast_to(np.asarray(viewing_radius, dtype=float), self.heading.shape).copy()
+        self.viewing_hwidth = np.broadcast_to(np.asarray(viewing_hwidth, dtype=float), self.heading.shape).copy()
+        self.grove_xy = np.array(grove_xy, dtype=float) # (B, G, 2)
+        self.grove_r = np.array(grove_r, dtype=float) # (B, G)
+        if grove_mask is None:
+            grove_mask = np.ones(self.grove_r.shape, dtype=bool)
+        self.grove_mask = np.array(grove_mask, dtype=bool)
+        self.board_limits = np.array(board_limits, dtype=float) # [-x, x, -y, y]
+        self.hidden = np.zeros(self.heading.shape, dtype=bool)
+        self.alive = np.ones(self.heading.shape, dtype=bool)
+        self.winner = np.full(self.n_boards, NO_WINNER, dtype=np.int8)
+        self.step_num = np.zeros(self.n_boards, dtype=np.int64)
+
+    @property
+    def n_boards(self) -> int:
+        return self.heading.shape[0]
+
+    @property
+    def n_tanks(self) -> int:
+        return self.heading.shape[1]
+
+    @property
+    def done(self):
+        return self.winner != NO_WINNER
+
+    @classmethod
+    def from_boards(cls, boards) -> 'BatchWorld':
+        # gather the state of SimulationBoard instances with the same number of tanks (blue team first, then red)
+        n_grove = max(len(board.grove_r) for board in boards)
+        grove_xy = np.zeros((len(boards), n_grove, 2))
+        grove_r = np.zeros((len(boards), n_grove))
+        grove_mask = np.zeros((len(boards), n_grove), dtype=bool)
+        for ii, board in enumerate(boards):
+            n = len(board.grove_r)
+            grove_xy[ii, :n] = np.reshape(board.grove_xy, (-1, 2))
+            grove_r[ii, :n] = board.grove_r
+            grove_mask[ii, :n] = True
+        tanks = [board.tanks for board in boards]
+        world = cls(pos=[[tank.loc_xy for tank in pair] for pair in tanks],
+                    heading=[[tank.heading for tank in pair] for pair in tanks],
+                    team=[[BLUE if tank.team == 'blue' else RED for tank in pair] for pair in tanks],
+                    grove_xy=grove_xy, grove_r=grove_r, grove_mask=grove_mask,
+                    board_limits=boards[0].board_limits,
+                    viewing_radius=[[tank.viewing_radius for tank in pair] for pair in tanks],
+                    viewing_hwidth=[[tank.viewing_hwidth for tank in pair] for pair in tanks])
+        world.hidden[:] = [[tank.hidden for tank in pair] for pair in tanks]
+        world.alive[:] = [[tank.alive for tank in pair] for pair in tanks]
+        return world
+
+    @classmethod
+    def random(cls, n_boards, n_grove=6, board_limits=(-500, 500, -500, 500), rng=None) -> 'BatchWorld':
+        # blue and red tanks at their usual starting spots with groves placed like SimulationBoard does
+        rng = np.random.default_rng(rng)
+        limits = np.array(board_limits, dtype=float)
+        grove_xy = np.empty((n_boards, n_grove, 2))
+        span = limits[1::2] - limits[::2]
+        lo = limits[::2] + 0.1*span
+        grove_xy[..., 0] = rng.random((n_boards, n_grove))*0.8*span[0] + lo[0]
+        grove_xy[..., 1] = rng.random((n_boards, n_grove))*0.8*span[1] + lo[1]
+        grove_r = rng.random((n_boards, n_grove))*50 + 50
+        pos = np.broadcast_to(np.array([[0.0, 490.0], [0.0, -490.0]]), (n_boards, 2, 2))
+        heading = np.broadcast_to(np.array([180.0, 0.0]), (n_boards, 2))
+        return cls(pos, heading, [BLUE, RED], grove_xy, grove_r, board_limits=limits)
+
+    def pairwise(self):
+        # distance and bearing (0=N, 90=E) from every tank to every other tank on its board: (B, T, T)
+        delta = self.pos[:, None, :, :] - self.pos[:, :, None, :]
+        dist = np.hypot(delta[..., 0], delta[..., 1])
+        angle = 90 - np.rad2deg(np.arctan2(delta[..., 1], delta[..., 0]))
+        return dist, angle
+
+    def grove_geometry(self):
+        # distance and bearing from every tank to every grove on its board: (B, T, G)
+        delta = self.grove_xy[:, None, :, :] - self.pos[:, :, None, :]
+        dist = np.hypot(delta[..., 0], delta[..., 1])
+        angle = 90 - np.rad2deg(np.arctan2(delta[..., 1], delta[..., 0]))
+        return dist, angle
+
+    def enemies(self):
+        return self.team[:, :, None] != self.team[:, None, :]
+
+    def visibility(self):
+        # (B, T, T) True where tank i sees enemy tank j inside its viewing cone and j is neither hidden nor destroyed
+        dist, angle = self.pairwise()
+        angle_diff = np.abs(self.heading[:, :, None] - angle)
+        return ((dist <= self.viewing_radius[:, :, None]) & (angle_diff <= self.viewing_hwidth[:, :, None])
+                & ~self.hidden[:, None, :] & self.alive[:, None, :] & self.enemies())
+
+    def grove_visibility(self):
+        # (B, T, G) groves within each tank's viewing cone, and (B, T) tanks inside a grove in view
+        dist, angle = self.grove_geometry()
+        angle_diff = np.abs(self.heading[:, :, None] - angle)
+        in_view = ((dist - self.grove_r[:, None, :] <= self.viewing_radius[:, :, None])
+                   & (angle_diff <= self.viewing_hwidth[:, :, None]) & self.grove_mask[:, None, :])
+        concealed = np.any(in_view & (dist <= self.grove_r[:, None, :]), axis=2)
+        return in_view, concealed
+
+    def river_distance(self):
+        # (B, T, 4) distance to the river on the -x, +x, -y, +y edges
+        x = self.pos[..., 0]
+        y = self.pos[..., 1]
+        return np.abs(np.stack([x - self.board_limits[0], x - self.board_limits[1],
+                                y - self.board_limits[2], y - self.board_limits[3]], axis=-1))
+
+    def out_of_bounds(self):
+        # (B, T) tanks that have crossed into the river
+        x = self.pos[..., 0]
+        y = self.pos[..., 1]
+        return ((x < self.board_limits[0]) | (x > self.board_limits[1])
+                | (y < self.board_limits[2]) | (y > self.board_limits[3]))
+
+    def fire_outcome(self, firing):
+        # (B, T) FIRE_* outcome for every tank in ``firing``
+        return self.fire_targets(firing)[0]
+
+    def fire_targets(self, firing):
+        # (B, T) FIRE_* outcome for every tank in ``firing`` and the index of the tank it destroys (-1 for none):
+        # the shell meets the nearest surviving enemy lined up with the shooter's heading
+        dist, angle = self.pairwise()
+        angle_diff = np.abs(self.heading[:, :, None] - angle)
+        on_line = (dist*angle_diff <= 1000.0) & self.enemies() & self.alive[:, None, :]
+        line_dist = np.where(on_line, dist, np.inf)
+        target = np.argmin(line_dist, axis=2)
+        target_dist = np.take_along_axis(line_dist, target[..., None], axis=2)[..., 0]
+        hit = firing & (target_dist <= 400.0)
+        short = np.isfinite(target_dist) & (target_dist > 400.0)
+        outcome = np.where(hit, FIRE_HIT, np.where(short, FIRE_SHORT, FIRE_MISS))
+        return np.where(firing, outcome, FIRE_NONE).astype(np.int8), np.where(hit, target, -1)
+
+    def step(self, kind, value):
+        """Apply one action per tank and resolve it; returns the (B, T) fire outcomes.
+
+        ``kind`` and ``value`` are (B, T) arrays of ACTION_* codes and signed magnitudes. Tanks
+        that do not act this step (e.g. red while blue moves) get ACTION_IDLE, as do destroyed
+        tanks whatever they are given. Boards that are already decided are left untouched.
+        """
+        kind = np.where(self.alive, np.asarray(kind), ACTION_IDLE)
+        value = np.asarray(value, dtype=float)
+        undecided = ~self.done
+        active = undecided[:, None]
+        turning = (kind == ACTION_TURN) & active
+        moving = (kind == ACTION_MOVE) & active
+        firing = (kind == ACTION_FIRE) & active
+        self.heading += np.where(turning, np.clip(value, -45, 45), 0.0)
+        dist = np.where(moving, np.clip(value, -50, 50), 0.0)
+        rad = np.deg2rad(self.heading)
+        self.pos[..., 0] += dist*np.sin(rad)
+        self.pos[..., 1] += dist*np.cos(rad)
+        # every shot is taken before anything is destroyed, so a tank hit in this step still fires
+        outcome, target = self.fire_targets(firing)
+        boards, shooters = np.nonzero(target >= 0)
+        self.alive[boards, target[boards, shooters]] = False
+        # tanks in the river sink
+        self.alive &= ~(self.out_of_bounds() & active)
+        # a side with no tanks left loses; both sides gone is a draw
+        blue_left = np.any(self.alive & (self.team == BLUE), axis=1)
+        red_left = np.any(self.alive & (self.team == RED), axis=1)
+        self.winner = np.where(undecided & ~blue_left & ~red_left, DRAW,
+                               np.where(undecided & ~red_left, BLUE,
+                                        np.where(undecided & ~blue_left, RED, self.winner))).astype(np.int8)
+        # acting tanks look around and notice when they are concealed, as after an update_board call
+        _, concealed = self.grove_visibility()
+        self.hidden |= concealed & (kind != ACTION_IDLE) & ~self.done[:, None]
+        self.step_num += undecided
+        return outcome
+
+    def run(self, policy, n_steps):
+        """Play ``policy(world, step)`` -> (kind, value) for up to ``n_steps`` steps on every board.
+
+        Returns the winner per board (BLUE, RED, DRAW or NO_WINNER) once all boards are decided
+        or the steps run out.
+        """
+        for step in range(n_steps):
+            if np.all(self.done):
+                break
+            kind, value = policy(self, step)
+            self.step(kind, value)
+        return self.winner.copy()
@@ -0,0 +1,200 @@
+# background rendering of board images from compact state snapshots
+
+import logging
+import queue
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger('llm_pilot.render')
+
+
+class TankSnapshot(NamedTuple):
+    x: float
+    y: float
+    heading: float
+    viewing_radius: float
+    viewing_hwidth: float
+    color: str
+    fired: bool = False # the tank fired in this step
+    parsed: bool = True # False if the tank's action in this step was not understood
+    alive: bool = True
+
+
+class BoardSnapshot(NamedTuple):
+    """Everything needed to draw one board step; cheap to build and safe to hand to another thread."""
+    step_num: int
+    tanks: tuple # TankSnapshot per tank
+
+
+class BoardRenderer:
+    """Draws snapshots of one board onto a single reusable figure.
+
+    The groves, grid and limits are drawn once; each frame only moves the tank markers, heading
+    lines, viewing arcs and the fire/not-understood markers of every tank. Uses the object-oriented matplotlib
+    API (no pyplot state), so renderers can live in worker threads.
+    """
+
+    def __init__(self, grove_xy, grove_r, board_limits, rock_xy=(), rock_r=()) -> None:
+        # matplotlib is only imported once something is actually drawn
+        import matplotlib.patches as patches
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import PatchCollection
+        from matplotlib.figure import Figure
+        self.patches = patches
+        self.fig = Figure()
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        # static layer: groves and boulders (one collection each, so large maps draw quickly), grid and board limits
+        for xy, r, color in ((grove_xy, grove_r, 'g'), (rock_xy, rock_r, '0.4')):
+            if len(r):
+                self.ax.add_collection(PatchCollection([patches.Circle(c, radius) for c, radius in zip(xy, r)],
+                                                       color=color))
+        self.ax.grid()
+        self.ax.set_aspect('equal', 'box')
+        self.ax.set_xlim(board_limits[:2])
+        self.ax.set_ylim(board_limits[2:])
+        # moving artists, created on first use per tank
+        self.tank_artists = []
+
+    def draw(self, snapshot) -> None:
+        for ii, tank in enumerate(snapshot.tanks):
+            if ii == len(self.tank_artists):
+                marker, = self.ax.plot([], [], tank.color + 's', markersize=8)
+                heading_line, = self.ax.plot([], [], tank.color + '-', linewidth=3)
+                fire_line, = self.ax.plot([], [], tank.color + '--', linewidth=3)
+                miss_marker, = self.ax.plot([], [], 'kx', markersize=8)
+                self.tank_artists.append([marker, heading_line, fire_line, miss_marker, None])
+            marker, heading_line, fire_line, miss_marker, arc = self.tank_artists[ii]
+            rad = np.deg2rad(tank.heading)
+            marker.set_data([tank.x], [tank.y])
+            # destroyed tanks are drawn as hollow markers without heading or viewing arc
+            marker.set_markerfacecolor(tank.color if tank.alive else 'none')
+            if tank.alive:
+                heading_line.set_data([tank.x, tank.x + 100*np.sin(rad)], [tank.y, tank.y + 100*np.cos(rad)])
+            else:
+                heading_line.set_data([], [])
+            if tank.fired:
+                fire_line.set_data([tank.x, tank.x + 400*np.sin(rad)], [tank.y, tank.y + 400*np.cos(rad)])
+            else:
+                fire_line.set_data([], [])
+            if tank.parsed:
+                miss_marker.set_data([], [])
+            else:
+                miss_marker.set_data([tank.x], [tank.y])
+            # arcs have no setters for every field, so swap in a new one
+            if arc is not None:
+                arc.remove()
+                arc = None
+            if tank.alive:
+                arc = self.patches.Arc((tank.x, tank.y), tank.viewing_radius*2, tank.viewing_radius*2,
+                                       angle=90-tank.heading, theta1=-tank.viewing_hwidth,
+                                       theta2=tank.viewing_hwidth, color=tank.color, linewidth=1)
+                self.ax.add_patch(arc)
+            self.tank_artists[ii][4] = arc
+
+    def save(self, snapshot, path, dpi=300) -> None:
+        self.draw(snapshot)
+        self.fig.savefig(path, dpi=dpi)
+
+    def save_animation(self, snapshots, path, fps=2, dpi=100) -> None:
+        # one-shot GIF (pillow) or MP4 (ffmpeg) of the whole game
+        from matplotlib import animation
+        writer = animation.FFMpegWriter(fps=fps) if path.endswith('.mp4') else animation.PillowWriter(fps=fps)
+        with writer.saving(self.fig, path, dpi):
+            for snapshot in snapshots:
+                self.draw(snapshot)
+                writer.grab_frame()
+
+
+class RenderPipeline:
+    """Pool of worker threads rendering board snapshots off the game loop.
+
+    Boards register their static layout once and then ``submit`` snapshots, which only costs a
+    queue put. Each board is pinned to one worker so its frames are drawn in order on that
+    worker's reusable figure. Intermediate frames use ``preview_dpi`` when set and the final
+    frame of a game uses ``dpi``, also for games that end at the turn limit. Boards registered
+    with ``keep_snapshots`` have every snapshot kept until ``finish`` so the game can be exported
+    as an animation. Drawing time is recorded in ``metrics`` (a MetricsRegistry) when given.
+    """
+
+    def __init__(self, n_workers=2, dpi=300, preview_dpi=None, animation_fps=2, metrics=None) -> None:
+        self.metrics = metrics
+        self.dpi = dpi
+        self.preview_dpi = preview_dpi
+        self.animation_fps = animation_fps
+        self.errors = 0
+        self.boards = {}
+        self.lock = threading.Lock()
+        self.queues = [queue.Queue() for _ in range(n_workers)]
+        self.workers = [threading.Thread(target=self._work, args=(q,), daemon=True) for q in self.queues]
+        for worker in self.workers:
+            worker.start()
+
+    def register_board(self, key, grove_xy, grove_r, board_limits, rock_xy=(), rock_r=(), keep_snapshots=True) -> None:
+        with self.lock:
+            worker_queue = self.queues[len(self.boards) % len(self.queues)]
+            self.boards[key] = {'queue': worker_queue, 'snapshots': [] if keep_snapshots else None, 'last': None}
+        worker_queue.put(('layout', key, (list(grove_xy), list(grove_r), list(board_limits), list(rock_xy),
+                                          list(rock_r))))
+
+    def submit(self, key, snapshot, path=None, final=False) -> None:
+        # keep the snapshot for the animation (if any) and, if a path is given, render it to a PNG
+        board = self.boards[key]
+        board['last'] = snapshot
+        if board['snapshots'] is not None:
+            board['snapshots'].append(snapshot)
+        if path is not None:
+            dpi = self.dpi if final or self.preview_dpi is None else self.preview_dpi
+            board['queue'].put(('frame', key, (snapshot, path, dpi)))
+
+    def finish(self, key, animation_path=None, final_path=None) -> None:
+        # draw the last snapshot to final_path at full resolution and export the animation (if requested),
+        # then free the board's figure once its frames are done
+        with self.lock:
+            board = self.boards.pop(key)
+        if final_path is not None and board['last'] is not None:
+            board['queue'].put(('frame', key, (board['last'], final_path, self.dpi)))
+        board['queue'].put(('finish', key, (board['snapshots'] or [], animation_path)))
+
+    def join(self) -> None:
+        # wait until every submitted job has been rendered
+        for worker_queue in self.queues:
+            worker_queue.join()
+
+    def shutdown(self) -> None:
+        self.join()
+        for worker_queue in self.queues:
+            worker_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def _work(self, worker_queue) -> None:
+        renderers = {}
+        while True:
+            job = worker_queue.get()
+            if job is None:
+                worker_queue.task_done()
+                return
+            kind, key, args = job
+            start = time.perf_counter()
+            try:
+                if kind == 'layout':
+                    renderers[key] = BoardRenderer(*args)
+                elif kind == 'frame':
+                    renderers[key].save(*args)
+                elif kind == 'finish':
+                    snapshots, animation_path = args
+                    renderer = renderers.pop(key)
+                    if animation_path is not None and snapshots:
+                        renderer.save_animation(snapshots, animation_path, fps=self.animation_fps,
+                                                dpi=self.preview_dpi or 100)
+            except Exception:
+                self.errors += 1
+                logger.exception('Rendering %s for board %s failed', kind, key)
+            finally:
+                if self.metrics is not None:
+                    self.metrics.observe('phase_seconds', time.perf_counter() - start, phase='render_' + kind)
+                worker_queue.task_done()
@@ -0,0 +1,55 @@
+# captain orders, generated on first use instead of at import and served from the response cache afterwards
+
+import threading
+
+from .backends import build_lm
+from .metrics import MetricsRegistry
+
+BLUE_DIRECTIVE = ('You are the captain giving orders over radio to a tank asset that is about '
+    'to engage in combat with an adversary tank. The battlefield is a flat plain encircled by an impassable river. '
+    'You know the other tank is at the other end of the battlefield but not precisely where it is. Your tank pilot cannot see it because of fog. '
+    'Somewhere near the middle, there are small groves of trees with thick underbrush where a tank would be able to hide. '
+    'You know that both tank models can only see a limited view to their front, and the turrets cannot swivel. '
+    'The tanks are able to turn, move forward or backwards, and fire. '
+    'You are one of the good guys. You value honor, chivalry, and want to give the adversary a fair fight and ultimately a noble death. '
+    'Your task now is to come up with a short speech that will inspire the tank pilot to follow your ideals and achieve victory.'
+    'Please use virtuous, flowery, and militaristic language in your speech, and limit it to 5 sentences or less.')
+
+RED_DIRECTIVE = ('You are the captain giving orders over radio to a tank asset that is about '
+    'to engage in combat with an adversary tank. The battlefield is a flat plain encircled by an impassable river. '
+    'You know the other tank is at the other end of the battlefield but not precisely where it is. Your tank pilot cannot see it because of fog. '
+    'Somewhere near the middle, there are small groves of trees with thick underbrush where a tank would be able to hide. '
+    'You know that both tank models can only see a limited view to their front, and the turrets cannot swivel. '
+    'The tanks are able to turn, move forward or backwards, and fire. '
+    'You are one of the bad guys, though you might not see yourself that way. You value cunning, dirty tactics, and want to destroy your opponent at any cost. '
+    'Your task now is to come up with a short speech that will force the lazy, no-good tank pilot to follow your ideals and achieve victory.'
+    'Please use harsh, derogatory, and militaristic language in your speech, and limit it to 5 sentences or less.')
+
+_orders = {}
+_orders_lock = threading.Lock()
+
+
+def captain_order(directive, lm) -> str:
+    # one TankCaptain call on the given LM
+    import dspy
+    from .signatures import TankCaptain
+    with dspy.settings.context(lm=lm):
+        return dspy.Predict(TankCaptain)(directive=directive).order
+
+
+def captain_orders(backend=None, cache=None, metrics=None, temperature=0.2, variant=0) -> tuple:
+    """Blue and red captain orders as text, generated the first time they are asked for.
+
+    Later calls in the same process reuse them, and with ``cache`` (a ResponseCache) later runs
+    read them back from disk instead of calling the model. Calls are recorded in ``metrics``.
+    ``variant`` numbers independent pairs of orders at the same temperature: every variant after
+    the first is sampled with its own seed, so it is a separate request and cache entry.
+    """
+    key = (backend, id(cache), temperature, variant)
+    with _orders_lock:
+        if key not in _orders:
+            options = {'seed': variant} if variant else {}
+            lm, _ = build_lm(backend, temperature, MetricsRegistry() if metrics is None else metrics, cache,
+                             **options)
+            _orders[key] = (captain_order(BLUE_DIRECTIVE, lm), captain_order(RED_DIRECTIVE, lm))
+        return _orders[key]
@@ -0,0 +1,105 @@
+# command-line entry point: python -m llm_pilot [options]
+
+import argparse
+import datetime
+import os
+
+import numpy as np
+
+from .backends import default_backend
+from .board_render import RenderPipeline
+from .captain import captain_orders
+from .llm_cache import ResponseCache
+from .metrics import MetricsRegistry
+from .resilience import TokenBucket, configure_http_pool
+from .tournament import run_tournament, print_tournament_summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m llm_pilot',
+                                     description='Play a tournament of LLM-piloted tank battles over a grid of '
+                                                 'temperatures, seeds and captain orders.')
+    parser.add_argument('--backend', default=None,
+                        help="LM backend: 'openai', 'mock' or 'scripted' (default: $LLM_PILOT_BACKEND or openai)")
+    parser.add_argument('--n-turns', type=int, default=50, help='maximum number of turns per game')
+    parser.add_argument('--temperatures', type=float, nargs='+', default=list(np.linspace(0.7, 1.0, 4)),
+                        help='temperatures to try')
+    parser.add_argument('--seeds', type=int, default=8, help='board layouts to play at every temperature')
+    parser.add_argument('--captain-temperatures', type=float, nargs='+', default=[0.2],
+                        help='temperatures the captain orders are generated at')
+    parser.add_argument('--order-pairs', type=int, default=1,
+                        help='pairs of captain orders to play at every captain temperature')
+    parser.add_argument('--workers', type=int, default=16, help='games played at once')
+    parser.add_argument('--blue-tanks', type=int, default=1, help='tanks on the blue team')
+    parser.add_argument('--red-tanks', type=int, default=1, help='tanks on the red team')
+    parser.add_argument('--simultaneous', action='store_true',
+                        help='resolve all actions of a turn at once (always the case with more than one tank per side)')
+    parser.add_argument('--no-stream', action='store_true',
+                        help='wait for whole pilot replies instead of stopping them at the first complete action')
+    parser.add_argument('--debrief-max-tokens', type=int, default=150, help='token limit of the end-of-game debriefs')
+    parser.add_argument('--rate', type=float, default=2.0, help='pilot calls per second across all games')
+    parser.add_argument('--burst', type=int, default=10, help='pilot calls allowed in one burst')
+    parser.add_argument('--cache', default='llm_response_cache.sqlite', help="response cache file ('' for none)")
+    parser.add_argument('--cache-max-mb', type=float, default=512,
+                        help='least recently used responses are evicted beyond this size')
+    parser.add_argument('--replay-only', action='store_true',
+                        help='only replay cached responses and never call the remote model')
+    parser.add_argument('--checkpoint', default='',
+                        help='record games in this file; re-running with the same file and settings skips finished '
+                             'games and resumes half-played ones')
+    parser.add_argument('--game-timeout', type=float, default=3600, help='seconds before a game is abandoned')
+    parser.add_argument('--render-workers', type=int, default=4, help='threads drawing board images')
+    parser.add_argument('--dpi', type=int, default=300, help='resolution of the final frame of each game')
+    parser.add_argument('--preview-dpi', type=int, default=100, help='resolution of the other frames')
+    parser.add_argument('--animation', choices=['gif', 'mp4', 'none'], default='gif', help='animation of each game')
+    parser.add_argument('--api-key-path', default='../../openai_secret_key.txt',
+                        help='file holding the OpenAI API key, used when $OPENAI_API_KEY is not set')
+    args = parser.parse_args(argv)
+    if not args.rate > 0:
+        parser.error('--rate must be positive')
+    if args.burst < 1:
+        parser.error('--burst must be at least 1')
+    if args.order_pairs < 1:
+        parser.error('--order-pairs must be at least 1')
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    backend = args.backend or default_backend()
+    if backend == 'openai':
+        import openai
+        # one keep-alive connection pool for every captain and pilot call
+        configure_http_pool(max_connections=32, timeout=60.0)
+        if not os.environ.get('OPENAI_API_KEY') and os.path.exists(args.api_key_path):
+            with open(args.api_key_path) as f:
+                openai.api_key = f.read().strip()
+    # responses are cached on disk, so re-running with the same prompts costs nothing
+    cache = None
+    if args.cache:
+        cache = ResponseCache(args.cache, max_bytes=int(args.cache_max_mb*1024*1024), replay_only=args.replay_only)
+    # tournament-wide metrics (including the captain calls), exported next to the per-game metrics files
+    tournament_metrics = MetricsRegistry()
+    # captain orders to play: order_pairs pairs at every captain temperature
+    orders = [captain_orders(backend, cache, tournament_metrics, temperature=temperature, variant=variant)
+              for temperature in args.captain_temperatures for variant in range(args.order_pairs)]
+    # pace pilot calls across all games instead of sleeping after each one
+    rate_limiter = TokenBucket(rate=args.rate, capacity=args.burst)
+    # draw low-dpi previews on a few background threads and keep an animation of every game
+    render_pipeline = RenderPipeline(n_workers=args.render_workers, dpi=args.dpi, preview_dpi=args.preview_dpi,
+                                     metrics=tournament_metrics)
+    results = run_tournament(orders, args.temperatures, range(args.seeds), n_turns=args.n_turns,
+                             max_workers=args.workers, metrics=tournament_metrics, checkpoint=args.checkpoint or None,
+                             backend=backend, rate_limiter=rate_limiter, cache=cache, render_pipeline=render_pipeline,
+                             animation=None if args.animation == 'none' else args.animation,
+                             game_timeout=args.game_timeout, n_blue=args.blue_tanks, n_red=args.red_tanks,
+                             simultaneous=args.simultaneous or None, stream_replies=not args.no_stream,
+                             debrief_max_tokens=args.debrief_max_tokens)
+    render_pipeline.shutdown()
+    tournament_metrics.write('tournament_metrics_' + str(datetime.datetime.now()).replace('-','_').replace(' ','T').replace(':','').split('.')[0])
+    print_tournament_summary(results)
+    if cache is not None:
+        print('\nResponse cache: {} hits, {} misses'.format(cache.hits, cache.misses))
+
+    print('\nComplete.')
+    return 0
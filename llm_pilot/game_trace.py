@@ -0,0 +1,200 @@
+# compact append-only binary trace of a game, with an offset index for random access
+
+import json
+import os
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+from .action_parser import parse_action
+
+MAGIC = b'LPTRACE1'
+NO_ACTOR = 255
+
+# game_end codes
+GAME_CONTINUE = 0
+GAME_BLUE_VICTORY = 1
+GAME_RED_VICTORY = 2
+GAME_DRAW = 3 # both sides destroyed in the same step
+
+# per-tank flags
+HIDDEN = 1
+DESTROYED = 2
+
+# record: length, step, actor, action kind, fire outcome, game end, value, magnitude, latency,
+# prompt tokens, completion tokens, number of tanks; then per tank x, y, heading, flags;
+# then the action text
+_RECORD = struct.Struct('<IIBBBBfffIIB')
+_TANK = struct.Struct('<dddB')
+_TEXT_LEN = struct.Struct('<H')
+_LENGTH = struct.Struct('<I')
+_OFFSET = struct.Struct('<Q')
+
+
+class TankState(NamedTuple):
+    x: float
+    y: float
+    heading: float
+    hidden: bool
+    alive: bool = True
+
+
+class TraceStep(NamedTuple):
+    step: int
+    actor: int # index of the acting tank, NO_ACTOR for the initial state
+    action: str # action text as played
+    kind: int # batch_physics ACTION_* code of the parsed action
+    value: float # signed, clamped value applied
+    magnitude: float # number requested by the pilot
+    fire: int # batch_physics FIRE_* outcome
+    game_end: int # GAME_* code
+    latency: float # seconds spent waiting for the pilot's action
+    prompt_tokens: int
+    completion_tokens: int
+    tanks: tuple # TankState per tank after the step
+
+
+def game_end_code(game_end) -> int:
+    if 'Blue victory' in game_end:
+        return GAME_BLUE_VICTORY
+    if 'Red victory' in game_end:
+        return GAME_RED_VICTORY
+    if game_end.startswith('Draw'):
+        return GAME_DRAW
+    return GAME_CONTINUE
+
+
+class TraceWriter:
+    """Appends one fixed-layout record per step to ``<path>`` and its offset to ``<path>.idx``.
+
+    The header is a length-prefixed JSON blob with everything needed to rebuild the board
+    (orders, seed, grove layout, settings). Both files are flushed after every step so an
+    interrupted game can be read back up to its last completed step.
+    """
+
+    def __init__(self, path, header) -> None:
+        self.path = path
+        self.file = open(path, 'wb')
+        self.index = open(path + '.idx', 'wb')
+        meta = json.dumps(header).encode('utf-8')
+        self.file.write(MAGIC + _OFFSET.pack(len(meta)) + meta)
+        self.file.flush()
+
+    @classmethod
+    def reopen(cls, path) -> 'TraceWriter':
+        # continue an existing trace (e.g. when resuming a game), dropping a partially written last record
+        reader = TraceReader(path)
+        offsets = reader.offsets
+        end = reader.data_start
+        if offsets:
+            reader.file.seek(offsets[-1])
+            end = offsets[-1] + _LENGTH.unpack(reader.file.read(_LENGTH.size))[0]
+        reader.close()
+        writer = cls.__new__(cls)
+        writer.path = path
+        writer.file = open(path, 'r+b')
+        writer.file.truncate(end)
+        writer.file.seek(end)
+        writer.index = open(path + '.idx', 'wb')
+        writer.index.write(b''.join(_OFFSET.pack(offset) for offset in offsets))
+        writer.index.flush()
+        return writer
+
+    def write(self, step, actor, action, tanks, fire=0, game_end=GAME_CONTINUE, latency=0.0, prompt_tokens=0,
+              completion_tokens=0) -> None:
+        parsed = parse_action(action)
+        text = action.encode('utf-8')[:65535]
+        # tanks are (x, y, heading, hidden) or (x, y, heading, hidden, alive)
+        body = b''.join(_TANK.pack(x, y, heading, (HIDDEN if hidden else 0) | (0 if all(alive) else DESTROYED))
+                        for x, y, heading, hidden, *alive in tanks)
+        length = _RECORD.size + len(body) + _TEXT_LEN.size + len(text)
+        record = (_RECORD.pack(length, step, actor, parsed.code, fire, game_end, parsed.value, parsed.magnitude,
+                               latency, prompt_tokens, completion_tokens, len(tanks))
+                  + body + _TEXT_LEN.pack(len(text)) + text)
+        # the record goes out before its index entry, so the index never points at a partial record
+        offset = self.file.tell()
+        self.file.write(record)
+        self.file.flush()
+        self.index.write(_OFFSET.pack(offset))
+        self.index.flush()
+
+    def close(self) -> None:
+        self.file.close()
+        self.index.close()
+
+
+class TraceReader:
+    """Random access to the steps of a trace written by TraceWriter.
+
+    ``reader[n]`` returns the TraceStep for step n by seeking straight to its record; if the
+    index file is missing or shorter than the trace (e.g. after a crash) it is rebuilt by
+    scanning the record lengths. ``columns()`` loads whole traces as NumPy arrays for analysis.
+    """
+
+    def __init__(self, path) -> None:
+        self.path = path
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a game trace'.format(path))
+        (meta_len,) = _OFFSET.unpack(self.file.read(_OFFSET.size))
+        self.header = json.loads(self.file.read(meta_len).decode('utf-8'))
+        self.data_start = self.file.tell()
+        self.offsets = self._load_index()
+
+    def _load_index(self):
+        offsets = []
+        if os.path.exists(self.path + '.idx'):
+            with open(self.path + '.idx', 'rb') as f:
+                raw = f.read()
+            offsets = list(np.frombuffer(raw[:len(raw) - len(raw) % _OFFSET.size], dtype='<u8'))
+        # scan for records past the end of the index (or all of them if it is missing)
+        end = os.path.getsize(self.path)
+        position = self.data_start
+        if offsets:
+            self.file.seek(offsets[-1])
+            position = int(offsets[-1]) + _LENGTH.unpack(self.file.read(_LENGTH.size))[0]
+        while position + _LENGTH.size <= end:
+            self.file.seek(position)
+            (length,) = _LENGTH.unpack(self.file.read(_LENGTH.size))
+            if position + length > end:
+                break # partially written last record
+            offsets.append(position)
+            position += length
+        return [int(offset) for offset in offsets]
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, n) -> TraceStep:
+        if n < 0:
+            n += len(self.offsets)
+        self.file.seek(self.offsets[n])
+        fixed = _RECORD.unpack(self.file.read(_RECORD.size))
+        (_, step, actor, kind, fire, game_end, value, magnitude, latency, prompt_tokens, completion_tokens,
+         n_tanks) = fixed
+        tanks = tuple(TankState(x, y, heading, bool(flags & HIDDEN), not flags & DESTROYED)
+                      for x, y, heading, flags in _TANK.iter_unpack(self.file.read(_TANK.size*n_tanks)))
+        (text_len,) = _TEXT_LEN.unpack(self.file.read(_TEXT_LEN.size))
+        action = self.file.read(text_len).decode('utf-8', errors='replace')
+        return TraceStep(step, actor, action, kind, value, magnitude, fire, game_end, latency, prompt_tokens,
+                         completion_tokens, tanks)
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self[n]
+
+    def columns(self) -> dict:
+        # every field as an array over steps; tank positions, headings, hidden and alive flags are (steps, tanks)
+        steps = list(self)
+        columns = {field: np.array([getattr(s, field) for s in steps])
+                   for field in TraceStep._fields if field not in ('tanks', 'action')}
+        columns['action'] = [s.action for s in steps]
+        columns['xy'] = np.array([[(t.x, t.y) for t in s.tanks] for s in steps])
+        columns['heading'] = np.array([[t.heading for t in s.tanks] for s in steps])
+        columns['hidden'] = np.array([[t.hidden for t in s.tanks] for s in steps])
+        columns['alive'] = np.array([[t.alive for t in s.tanks] for s in steps])
+        return columns
+
+    def close(self) -> None:
+        self.file.close()
@@ -0,0 +1,138 @@
+# on-disk response cache for the dspy LMs driving the tank captains and pilots
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class CacheMissError(KeyError):
+    """Raised in replay-only mode when a prompt has no cached response."""
+
+
+class ResponseCache:
+    """Content-addressed SQLite store of LM completions.
+
+    Entries are keyed on a hash of the model, temperature, remaining request settings and the
+    full prompt. dspy renders a signature's instructions and field prefixes into the prompt, so
+    TankCaptain and TankPilot calls never share keys. When ``max_bytes`` is set, the least
+    recently used entries are evicted once the stored completions grow past it. With
+    ``replay_only`` set, misses raise CacheMissError instead of reaching the remote model,
+    which keeps regression runs deterministic and offline.
+    """
+
+    def __init__(self, path='llm_response_cache.sqlite', max_bytes=None, replay_only=False) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # one connection shared by all game threads, serialized by the lock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                          'key TEXT PRIMARY KEY, model TEXT, temperature REAL, prompt TEXT, '
+                          'completions TEXT, size INTEGER, created REAL, last_access REAL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self.conn.commit()
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def make_key(prompt, request) -> str:
+        # request holds the merged LM kwargs (model, temperature, max_tokens, n, ...)
+        payload = json.dumps({'prompt': prompt, 'request': request}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT completions FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, prompt, request, completions) -> None:
+        data = json.dumps(completions)
+        size = len(data.encode('utf-8')) + len(prompt.encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                              (key, str(request.get('model')), request.get('temperature'), prompt,
+                               data, size, now, now))
+            self.total_bytes += size
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        # drop least recently used entries until the cache fits in max_bytes (caller holds the lock)
+        if self.max_bytes is None:
+            return
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute('SELECT key, size FROM responses ORDER BY last_access LIMIT 64').fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class CachedLM:
+    """Wraps a dspy LM (e.g. dspy.OpenAI) so completions are served from a ResponseCache.
+
+    Only ``__call__`` is intercepted; everything else (kwargs, history, inspect_history, ...)
+    is forwarded to the wrapped LM, so the wrapper can be passed anywhere dspy expects an LM.
+    Hits and misses are counted in ``metrics`` (a MetricsRegistry) when given.
+    """
+
+    def __init__(self, lm, cache, metrics=None) -> None:
+        self.lm = lm
+        self.cache = cache
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self.lm, name)
+
+    def __call__(self, prompt, only_completed=True, return_sorted=False, **kwargs):
+        from .backends import streaming_stop
+        request = {**self.lm.kwargs, **kwargs}
+        stop = streaming_stop()
+        if stop is not None:
+            # streamed completions are cut short, so they never stand in for whole ones (or the other way round)
+            request['stream_until'] = getattr(stop, '__qualname__', repr(stop))
+        key = self.cache.make_key(prompt, request)
+        completions = self.cache.get(key)
+        if self.metrics is not None:
+            self.metrics.inc('llm_cache_misses_total' if completions is None else 'llm_cache_hits_total')
+        if completions is not None:
+            return completions
+        if self.cache.replay_only:
+            raise CacheMissError('no cached response for prompt (replay-only mode): {!r}'.format(prompt[-200:]))
+        completions = self.lm(prompt, only_completed=only_completed, return_sorted=return_sorted, **kwargs)
+        self.cache.put(key, prompt, request, list(completions))
+        return completions
+
+    def copy(self, **kwargs):
+        return CachedLM(self.lm.copy(**kwargs), self.cache, self.metrics)
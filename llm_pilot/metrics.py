@@ -0,0 +1,199 @@
+# counters and histograms for model calls and simulation phases, exportable as Prometheus text or JSON
+
+import bisect
+import contextlib
+import functools
+import json
+import threading
+import time
+
+from .pilot_transcript import count_tokens
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+DESCRIPTIONS = {
+    'llm_call_seconds': ('histogram', 'Wall-clock time of each LM request.'),
+    'llm_calls_total': ('counter', 'LM requests made (cache hits excluded).'),
+    'llm_cache_hits_total': ('counter', 'LM requests served from the response cache.'),
+    'llm_cache_misses_total': ('counter', 'LM requests not found in the response cache.'),
+    'llm_errors_total': ('counter', 'LM requests that raised.'),
+    'llm_prompt_tokens': ('histogram', 'Prompt tokens per LM request.'),
+    'llm_retries_total': ('counter', 'LM requests retried after a transient error, by status or error type.'),
+    'llm_backoff_seconds': ('histogram', 'Time slept before retrying an LM request.'),
+    'llm_completion_tokens_total': ('counter', 'Completion tokens received.'),
+    'pilot_calls_total': ('counter', 'Pilot predictor calls (actions and debriefs).'),
+    'pilot_retries_total': ('counter', 'Extra LM requests made while serving a predictor call.'),
+    'pilot_time_to_action_seconds': ('histogram', 'Time from a pilot call leaving the rate limiter until its action is in.'),
+    'phase_seconds': ('histogram', 'Time spent per simulation phase.'),
+    'rate_limit_wait_seconds': ('histogram', 'Time spent waiting on the rate limiter before a pilot call.'),
+    'games_total': ('counter', 'Games finished, by outcome.'),
+}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=SECONDS_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0]*(len(self.buckets) + 1) # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other) -> None:
+        for ii, n in enumerate(other.counts):
+            self.counts[ii] += n
+        self.sum += other.sum
+        self.count += other.count
+
+
+class MetricsRegistry:
+    """Thread-safe set of labeled counters and histograms.
+
+    Boards keep one registry per game; a tournament merges them into its own. Metric names and
+    help text come from DESCRIPTIONS, so exports are consistent across games.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters = {} # (name, labels) -> value
+        self.histograms = {} # (name, labels) -> Histogram
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, amount=1, **labels) -> None:
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels) -> None:
+        key = self._key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def time(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def value(self, name, **labels):
+        return self.counters.get(self._key(name, labels), 0)
+
+    def merge(self, other) -> None:
+        with other.lock:
+            counters = dict(other.counters)
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in other.histograms.items()}
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (buckets, counts, total, count) in histograms.items():
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                histogram = Histogram(buckets)
+                histogram.counts, histogram.sum, histogram.count = counts, total, count
+                self.histograms[key].merge(histogram)
+
+    def to_json(self) -> dict:
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{'name': name, 'labels': dict(labels), 'buckets': list(h.buckets),
+                           'counts': list(h.counts), 'sum': h.sum, 'count': h.count}
+                          for (name, labels), h in sorted(self.histograms.items())]
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self) -> str:
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append('# HELP {} {}'.format(name, DESCRIPTIONS.get(name, (kind, name))[1]))
+                lines.append('# TYPE {} {}'.format(name, kind))
+
+        def label_str(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join('{}="{}"'.format(k, v.replace('"', '\\"')) for k, v in pairs) + '}'
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                describe(name, 'counter')
+                lines.append('{}{} {}'.format(name, label_str(labels), value))
+            for (name, labels), h in sorted(self.histograms.items()):
+                describe(name, 'histogram')
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ['+Inf'], h.counts):
+                    cumulative += n
+                    lines.append('{}_bucket{} {}'.format(name, label_str(labels, [('le', str(bound))]), cumulative))
+                lines.append('{}_sum{} {}'.format(name, label_str(labels), h.sum))
+                lines.append('{}_count{} {}'.format(name, label_str(labels), h.count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path_prefix) -> None:
+        # <prefix>.json and <prefix>.prom
+        with open(path_prefix + '.json', 'w') as f:
+            json.dump(self.to_json(), f, indent=1)
+        with open(path_prefix + '.prom', 'w') as f:
+            f.write(self.to_prometheus())
+
+
+def timed_phase(phase):
+    """Method decorator recording the call's duration in ``self.metrics`` under phase_seconds."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.time('phase_seconds', phase=phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class InstrumentedLM:
+    """Wraps a dspy LM to record latency, token counts and errors of every request in a registry."""
+
+    def __init__(self, lm, metrics) -> None:
+        self.lm = lm
+        self.metrics = metrics
+        self.local = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(self.lm, name)
+
+    def calls_in_thread(self) -> int:
+        # requests made from the calling thread, so concurrent pilots can count their own retries
+        return getattr(self.local, 'calls', 0)
+
+    def __call__(self, prompt, *args, **kwargs):
+        self.metrics.inc('llm_calls_total')
+        self.local.calls = self.calls_in_thread() + 1
+        self.metrics.observe('llm_prompt_tokens', count_tokens(prompt), buckets=TOKEN_BUCKETS)
+        start = time.perf_counter()
+        try:
+            completions = self.lm(prompt, *args, **kwargs)
+        except Exception:
+            self.metrics.inc('llm_errors_total')
+            raise
+        finally:
+            self.metrics.observe('llm_call_seconds', time.perf_counter() - start)
+        self.metrics.inc('llm_completion_tokens_total', sum(count_tokens(c) for c in completions))
+        return completions
+
+    def copy(self, **kwargs):
+        clone = InstrumentedLM(self.lm.copy(**kwargs), self.metrics)
+        clone.local = self.local
+        return clone
@@ -0,0 +1,128 @@
+# structured per-tank transcript rendering a bounded prompt for the tank pilot
+
+import re
+
+from .action_parser import parse_action
+
+_WORD_PIECES = re.compile(r'\w+|[^\w\s]')
+# one-on-one and team wordings ('the enemy tank' / 'an enemy tank') of sightings and hits
+_ENEMY_SIGHTING = re.compile(r'You see (?:the|an) enemy tank [^!]*!')
+_ENEMY_HIT = re.compile(r'strikes (?:the|an) enemy tank')
+_encoding = [] # tiktoken encoding (or None), loaded on first use since it may download its tables
+
+
+def count_tokens(text) -> int:
+    # exact count with tiktoken when installed, otherwise roughly one token per word or symbol
+    if not _encoding:
+        try:
+            import tiktoken
+            _encoding.append(tiktoken.get_encoding('cl100k_base'))
+        except ImportError:
+            _encoding.append(None)
+    if _encoding[0] is not None:
+        return len(_encoding[0].encode(text))
+    return len(_WORD_PIECES.findall(text))
+
+
+class TurnRecord:
+    """One pilot turn: the action taken, the messages it produced and the following observation."""
+
+    __slots__ = ('turn', 'action', 'events', 'observation', 'fired', 'parsed', 'text', 'tokens')
+
+    def __init__(self, turn, action, events, observation, fired=False, parsed=True) -> None:
+        self.turn = turn
+        self.action = action
+        self.events = tuple(events)
+        self.observation = observation
+        self.fired = fired
+        self.parsed = parsed
+        self.text = '\n' + action + '\n' + ''.join(self.events) + observation
+        self.tokens = count_tokens(self.text)
+
+
+class PilotTranscript:
+    """Turn-by-turn record of one tank's game, rendered into a bounded pilot prompt.
+
+    The prompt is the fixed header (situation, captain's orders, possible actions and the
+    opening observation), a one-paragraph summary of older turns, the last ``recent_turns``
+    turns verbatim and any closing notes (game end, debrief request). If ``token_budget`` is
+    set, more turns are folded into the summary until the prompt fits, always keeping the
+    latest turn verbatim. ``prompt_tokens`` records the size of every prompt sent.
+    """
+
+    def __init__(self, header, recent_turns=10, token_budget=None) -> None:
+        self.header = header
+        self.header_tokens = count_tokens(header)
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.turns = []
+        self.notes = []
+        self.prompt_tokens = []
+
+    def add_turn(self, action, events, observation, fired=False, parsed=True) -> TurnRecord:
+        record = TurnRecord(len(self.turns) + 1, action, events, observation, fired, parsed)
+        self.turns.append(record)
+        return record
+
+    def add_note(self, text) -> None:
+        self.notes.append(text)
+
+    def summarize(self, turns) -> str:
+        if not turns:
+            return ''
+        kinds = [parse_action(t.action).kind for t in turns]
+        n_turn = kinds.count('turn')
+        n_move = kinds.count('move')
+        n_fired = sum(t.fired for t in turns)
+        n_hit = sum(any(_ENEMY_HIT.search(event) for event in t.events) for t in turns)
+        n_not_understood = sum(not t.parsed for t in turns)
+        summary = '\n[Summary of turns {}-{}: you turned {} times, moved {} times and fired {} times ({} hits)'.format(
+            turns[0].turn, turns[-1].turn, n_turn, n_move, n_fired, n_hit)
+        if n_not_understood:
+            summary += '; {} actions were not understood'.format(n_not_understood)
+        summary += '.'
+        for record in reversed(turns):
+            sighting = _ENEMY_SIGHTING.search(record.observation)
+            if sighting is not None:
+                summary += ' On turn {}: {}'.format(record.turn, sighting.group(0))
+                break
+        else:
+            summary += ' You did not see the enemy tank during these turns.'
+        return summary + ']\n'
+
+    def render(self, recent_turns=None) -> str:
+        # header + summary of older turns + last turns verbatim + notes, shrunk to fit the token budget
+        n_recent = min(self.recent_turns if recent_turns is None else recent_turns, len(self.turns))
+        notes = ''.join(self.notes)
+        fixed_tokens = self.header_tokens + count_tokens(notes)
+        while True:
+            older = self.turns[:len(self.turns) - n_recent]
+            recent = self.turns[len(self.turns) - n_recent:]
+            summary = self.summarize(older)
+            if self.token_budget is None or n_recent <= 1:
+                break
+            tokens = fixed_tokens + count_tokens(summary) + sum(t.tokens for t in recent)
+            if tokens <= self.token_budget:
+                break
+            n_recent -= 1
+        return self.header + summary + ''.join(t.text for t in recent) + notes
+
+    def build_prompt(self) -> str:
+        # render the prompt for the next model call and record its size
+        prompt = self.render()
+        self.prompt_tokens.append(count_tokens(prompt))
+        return prompt
+
+    def snapshot(self) -> tuple:
+        # turns, notes and prompt sizes so far; turn records are immutable once added, so snapshots share them
+        return tuple(self.turns), tuple(self.notes), tuple(self.prompt_tokens)
+
+    def restore(self, state) -> None:
+        turns, notes, prompt_tokens = state
+        self.turns = list(turns)
+        self.notes = list(notes)
+        self.prompt_tokens = list(prompt_tokens)
+
+    def full_text(self) -> str:
+        # complete, unabridged transcript for logs and game results
+        return self.header + ''.join(t.text for t in self.turns) + ''.join(self.notes)
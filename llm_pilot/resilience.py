@@ -0,0 +1,178 @@
+# retries with jittered exponential backoff, rate limiting, per-game deadlines and a pooled HTTP client for model calls
+
+import random
+import threading
+import time
+
+RETRY_STATUSES = frozenset([408, 409, 429, 500, 502, 503, 504, 520, 522, 524])
+# transient error classes of the openai client (0.x and 1.x names), matched by name so either version works
+RETRY_ERRORS = frozenset(['RateLimitError', 'APIConnectionError', 'APITimeoutError', 'Timeout', 'TryAgain',
+                          'ServiceUnavailableError', 'InternalServerError', 'ConnectTimeout', 'ReadTimeout',
+                          'RemoteProtocolError', 'ConnectionError'])
+
+
+class GameTimeoutError(TimeoutError):
+    """Raised when a game runs past its deadline, including while backing off between retries."""
+
+
+def error_status(err):
+    # HTTP status of an exception from the openai client, the mock backend or requests/httpx, if any
+    for attr in ('http_status', 'status_code'):
+        status = getattr(err, attr, None)
+        if isinstance(status, int):
+            return status
+    response = getattr(err, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(err):
+    # seconds the server asked us to wait (Retry-After header), if it said so
+    headers = getattr(getattr(err, 'response', None), 'headers', None) or getattr(err, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter on rate-limit, 5xx and connection errors.
+
+    Attempt n (from 0) waits a uniform random time in [0, min(max_delay, base_delay*2**n)], or
+    the server's Retry-After if that is longer, and gives up after ``max_attempts`` requests.
+    """
+
+    def __init__(self, max_attempts=6, base_delay=0.5, max_delay=30.0, seed=None) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def is_retryable(self, err) -> bool:
+        status = error_status(err)
+        if status is not None:
+            return status in RETRY_STATUSES or status >= 500
+        return any(cls.__name__ in RETRY_ERRORS for cls in type(err).__mro__)
+
+    def backoff(self, attempt, err=None) -> float:
+        with self.lock:
+            delay = self.rng.uniform(0, min(self.max_delay, self.base_delay*2**attempt))
+        requested = None if err is None else retry_after(err)
+        return delay if requested is None else max(delay, min(requested, self.max_delay))
+
+
+# shared by every LM built without an explicit policy
+DEFAULT_RETRY_POLICY = RetryPolicy(max_attempts=8, base_delay=1.0, max_delay=60.0)
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how fast pilot calls go out to the model server.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``; ``acquire`` blocks
+    until enough tokens are available, so a burst of ``capacity`` calls may go out at once.
+    """
+
+    def __init__(self, rate=1.0, capacity=1) -> None:
+        if not rate > 0:
+            raise ValueError('token bucket rate must be positive, got {}'.format(rate))
+        if not capacity >= 1:
+            raise ValueError('token bucket capacity must be at least 1, got {}'.format(capacity))
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1) -> float:
+        # block until n tokens are available and return the time spent waiting
+        if n > self.capacity:
+            raise ValueError('cannot acquire {} tokens from a bucket holding at most {}'.format(n, self.capacity))
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill)*self.rate)
+                self.last_refill = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return waited
+                wait = (n - self.tokens)/self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class ResilientLM:
+    """Wraps a dspy LM so transient failures are retried according to a RetryPolicy.
+
+    Sleeps never run past ``deadline`` (a time.monotonic() value, set by the board for per-game
+    timeouts); a call that cannot finish in time raises GameTimeoutError. Retries and time spent
+    backing off are recorded in ``metrics`` (a MetricsRegistry) when given.
+    """
+
+    def __init__(self, lm, policy=None, metrics=None, deadline=None) -> None:
+        self.lm = lm
+        self.policy = RetryPolicy() if policy is None else policy
+        self.metrics = metrics
+        self.deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self.lm, name)
+
+    def __call__(self, prompt, *args, **kwargs):
+        attempt = 0
+        while True:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise GameTimeoutError('game deadline passed before the model call')
+            try:
+                return self.lm(prompt, *args, **kwargs)
+            except Exception as err:
+                attempt += 1
+                if attempt >= self.policy.max_attempts or not self.policy.is_retryable(err):
+                    raise
+                delay = self.policy.backoff(attempt - 1, err)
+                if self.deadline is not None and time.monotonic() + delay >= self.deadline:
+                    raise GameTimeoutError('game deadline passed while retrying the model call') from err
+                if self.metrics is not None:
+                    self.metrics.inc('llm_retries_total', status=error_status(err) or type(err).__name__)
+                    self.metrics.observe('llm_backoff_seconds', delay)
+                time.sleep(delay)
+
+    def copy(self, **kwargs):
+        return ResilientLM(self.lm.copy(**kwargs), self.policy, self.metrics, self.deadline)
+
+
+_http_pool = []
+
+
+def configure_http_pool(max_connections=32, max_keepalive=16, keepalive_expiry=60.0, timeout=60.0) -> None:
+    """Share one keep-alive connection pool across every openai request of the process.
+
+    Retries are left to ResilientLM, so the client's own retries are switched off; ``timeout``
+    bounds each request. Works with the 1.x client (httpx) and the legacy 0.x one (requests).
+    Called with the defaults the first time an openai LM is built, unless configured before.
+    """
+    import openai
+    _http_pool.append((max_connections, timeout))
+    if hasattr(openai, 'OpenAI'):
+        import httpx
+        openai.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                keepalive_expiry=keepalive_expiry),
+            timeout=timeout)
+        openai.max_retries = 0
+        openai.timeout = timeout
+    else:
+        import requests
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_keepalive, pool_maxsize=max_connections)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        openai.requestssession = session
+
+
+def ensure_http_pool() -> None:
+    if not _http_pool:
+        configure_http_pool()
@@ -0,0 +1,64 @@
+# branching rollouts: play several alternatives from one board state in parallel forks
+
+import concurrent.futures
+
+from .simulation import REPLY_CHARS
+from .tournament import game_outcome
+
+
+def rollout(board, branches, n_turns=5, max_workers=8) -> list:
+    """Play every branch from the current state of ``board`` in its own fork, in parallel.
+
+    Each branch is a dict: ``actions`` maps tank names to the action they take on the next step
+    instead of asking their pilot, and every other key goes to SimulationBoard.fork (e.g.
+    ``temperature``). All forks start from one snapshot, so the turns played so far are neither
+    replayed nor sent to the model again, and each plays up to ``n_turns`` more turns. Returns a
+    dict per branch, in order, with its outcome ('blue', 'red' or 'draw'), the turns played, the
+    prompt tokens spent after the fork and the finished fork itself.
+    """
+    state = board.snapshot()
+    limit = board.turns_played + n_turns
+    forks = []
+    for branch in branches:
+        fork_kwargs = {key: value for key, value in branch.items() if key != 'actions'}
+        forks.append(board.fork(state, **fork_kwargs))
+
+    def play(fork, branch):
+        game_end = fork.play_game(n_turns=limit, verbose=False, actions=branch.get('actions'))
+        prompt_tokens = sum(sum(tank.transcript.prompt_tokens[len(prefix[2]):])
+                            for tank, prefix in zip(fork.tanks, state.transcripts))
+        return {'branch': branch, 'outcome': game_outcome(game_end), 'turns': fork.turns_played - board.turns_played,
+                'prompt_tokens': prompt_tokens, 'board': fork}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(play, fork, branch) for fork, branch in zip(forks, branches)]
+        return [future.result() for future in futures]
+
+
+def explore_actions(board, candidates, tank=None, n_turns=5, max_workers=8, **fork_kwargs) -> list:
+    """Roll out each of ``candidates`` as the next action of ``tank`` (default: the next tank to act).
+
+    In simultaneous games the other tanks acting in the same step are asked once, in a scratch
+    fork, and play the same actions in every branch, so the branches differ only by the
+    candidate. ``fork_kwargs`` (e.g. ``temperature``) apply to every branch; see rollout for the
+    results.
+    """
+    actors = board.next_actors()
+    if not actors:
+        raise ValueError('the game on this board is over')
+    tank = actors[0] if tank is None else board.tank_named[tank] if isinstance(tank, str) else tank
+    if tank not in actors:
+        raise ValueError('{} does not act in the next step'.format(tank.name))
+    shared = {}
+    others = [other for other in actors if other is not tank]
+    if others:
+        import dspy
+        scout = board.fork(**fork_kwargs)
+        try:
+            with dspy.settings.context(lm=scout.lm):
+                replies = scout.ask_pilots([scout.tanks[other.index] for other in others])
+        finally:
+            scout.close()
+        shared = {other.name: action[:REPLY_CHARS] for other, (action, _, _) in zip(others, replies)}
+    branches = [dict(fork_kwargs, actions=dict(shared, **{tank.name: candidate})) for candidate in candidates]
+    return rollout(board, branches, n_turns, max_workers)
@@ -0,0 +1,23 @@
+# dspy signatures for the captains and pilots; imported only when a model call is about to be made
+
+import dspy
+
+from .action_parser import ACTION_GRAMMAR
+
+class TankCaptain(dspy.Signature):
+    """Gives direction and inspiration to the Tank Pilot."""
+
+    directive = dspy.InputField()
+    order = dspy.OutputField(desc="Short speech to the tank pilot communicating the captain's intent and setting the stage for the ensuing combat.")
+
+class TankPilot(dspy.Signature):
+    """Takes direction from the Tank Captain and chooses actions to pilot the tank."""
+
+    intent_and_status = dspy.InputField()
+    action = dspy.OutputField(desc="Choice of one action out of the limited available actions.")
+
+class TankPilotConstrained(dspy.Signature):
+    """Takes direction from the Tank Captain and chooses actions to pilot the tank."""
+
+    intent_and_status = dspy.InputField()
+    action = dspy.OutputField(desc="Choice of one action out of the limited available actions. " + ACTION_GRAMMAR)
@@ -0,0 +1,898 @@
+# tanks and the simulation board; importing this module makes no model calls and loads neither dspy nor matplotlib
+
+import datetime
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .action_parser import parse_action, action_end
+from .backends import build_lm, stream_until
+from .batch_physics import FIRE_NONE, FIRE_MISS, FIRE_SHORT, FIRE_HIT, FIRE_BLOCKED
+from .board_render import RenderPipeline, BoardSnapshot, TankSnapshot
+from .game_trace import TraceWriter, TraceReader, game_end_code, NO_ACTOR
+from .metrics import MetricsRegistry, timed_phase
+from .pilot_transcript import PilotTranscript, count_tokens
+from .resilience import GameTimeoutError
+from .spatial_index import ObstacleGrid, KIND_GROVE, KIND_ROCK
+
+# one logger for the game logs of every board; each board's file handler only takes that board's records
+GAME_LOG = logging.getLogger('llm_pilot.games')
+GAME_LOG.setLevel(logging.DEBUG)
+GAME_LOG.propagate = False
+_board_ids = itertools.count(1)
+
+# observer-tank pairs up to which observations use scalar math (array set-up costs more than a few pairs)
+SMALL_BATTLE = 4
+# pilot actions and debriefs are cut to this many characters
+REPLY_CHARS = 100
+
+def _action_stop(text):
+    # a streamed pilot reply is done once it holds a complete action, or once it is longer than what is kept
+    end = action_end(text)
+    if end is None and len(text) >= REPLY_CHARS:
+        return REPLY_CHARS
+    return end
+
+def _debrief_stop(text):
+    return REPLY_CHARS if len(text) >= REPLY_CHARS else None
+
+def order_text(order) -> str:
+    # captain orders may be given as TankCaptain predictions or as plain text
+    return order if isinstance(order, str) else order.values()[0]
+
+class Tank:
+    def __init__(self, actor='blue', constrained=False, board_limits=(-500, 500, -500, 500), offset_x=0.0,
+                 name=None) -> None:
+        # the constrained signature asks the model for the canonical action forms only
+        self.constrained = constrained
+        self._pilot = None
+        # team ('blue' or 'red'), name (e.g. 'blue2' in team battles) and position in the board's tank list
+        self.team = actor
+        self.name = actor if name is None else name
+        self.index = None
+        # team mates start side by side, offset_x m from the center of their edge
+        center_x = (board_limits[0] + board_limits[1])/2 + offset_x
+        if actor == 'blue':
+            # tank starting location, 10 m from the north edge
+            self.loc_xy = [center_x, board_limits[3] - 10]
+            # initial heading (0 is North or +y, 90 East or +x)
+            self.heading = 180
+            # vision radius in m
+            self.viewing_radius = 500
+            # vision half width in degrees
+            self.viewing_hwidth = 90
+        else:
+            # tank starting location, 10 m from the south edge
+            self.loc_xy = [center_x, board_limits[2] + 10]
+            # initial heading (0 is North or +y, 90 East or +x)
+            self.heading = 0
+            # vision radius in m
+            self.viewing_radius = 500
+            # vision half width in degrees
+            self.viewing_hwidth = 90
+        self.hidden = False # start unhidden
+        self.alive = True
+        self.last_action = None # most recent parsed Action
+
+    @property
+    def pilot(self):
+        # dspy predictor, built (and dspy imported) on the first pilot call
+        if self._pilot is None:
+            import dspy
+            from .signatures import TankPilot, TankPilotConstrained
+            self._pilot = dspy.Predict(TankPilotConstrained if self.constrained else TankPilot)
+        return self._pilot
+        
+    def update_status(self, action='move forward 50 m') -> tuple([bool, bool]):
+        # parse the action (kind and clamped, signed value) unless already parsed, and update status
+        self.last_action = parse_action(action) if isinstance(action, str) else action
+        if self.last_action.kind == 'turn':
+            self.heading = self.heading + self.last_action.value
+        elif self.last_action.kind == 'move':
+            self.loc_xy[1] = self.loc_xy[1] + self.last_action.value*np.cos(np.deg2rad(self.heading))
+            self.loc_xy[0] = self.loc_xy[0] + self.last_action.value*np.sin(np.deg2rad(self.heading))
+        fired = self.last_action.kind == 'fire'
+        parsed = self.last_action.kind != 'unknown'
+            
+        return fired, parsed
+
+class BoardState:
+    """Compact copy of everything that changes during a game, taken by SimulationBoard.snapshot.
+
+    Tank positions, headings and hidden/alive flags are one (tanks, 5) array. Transcripts are
+    kept as tuples of their (immutable) turn records, so snapshots and the forks made from them
+    share the turns played so far instead of copying their text.
+    """
+
+    __slots__ = ('step_num', 'turns_played', 'acted', 'game_end', 'tanks', 'last_actions', 'transcripts',
+                 'rng_state')
+
+    def __init__(self, board) -> None:
+        self.step_num = board.step_num
+        self.turns_played = board.turns_played
+        self.acted = frozenset(board.acted)
+        self.game_end = board.game_end
+        self.tanks = np.array([(tank.loc_xy[0], tank.loc_xy[1], tank.heading, tank.hidden, tank.alive)
+                               for tank in board.tanks], dtype=float)
+        self.tanks.flags.writeable = False
+        self.last_actions = tuple(tank.last_action for tank in board.tanks)
+        self.transcripts = tuple(tank.transcript.snapshot() for tank in board.tanks)
+        self.rng_state = board.rng.bit_generator.state
+
+class SimulationBoard:
+    def __init__(self, blue_order, red_order, temperature=0.2, seed=None, rate_limiter=None, tag='', cache=None,
+                 recent_turns=10, token_budget=3000, constrained_actions=False, render_pipeline=None,
+                 render_every=1, animation=None, groves=None, write_trace=True, backend=None,
+                 backend_options=None, retry_policy=None, game_timeout=None, save_folder=None,
+                 board_limits=(-500, 500, -500, 500), n_grove=6, n_rocks=0, rocks=None, occlusion=False, n_blue=1,
+                 n_red=1, formation_spacing=60.0, simultaneous=None, pilot_workers=None, stream_replies=True,
+                 debrief_max_tokens=150, keep_files=True) -> None:
+        # boards without files (e.g. replays for analysis) make no folder and write no log, metrics, trace or images
+        if not keep_files and (write_trace or render_every or animation is not None):
+            raise ValueError('a board with keep_files=False cannot write a trace or images')
+        # boards without a seed draw one from the OS, so every layout can be recreated from its seed
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+        # everything fork needs to set up an identical board (the layout is added once it is drawn)
+        self.settings = {'blue_order': blue_order, 'red_order': red_order, 'temperature': temperature, 'seed': seed,
+                         'rate_limiter': rate_limiter, 'cache': cache, 'recent_turns': recent_turns,
+                         'token_budget': token_budget, 'constrained_actions': constrained_actions,
+                         'backend': backend, 'backend_options': backend_options, 'retry_policy': retry_policy,
+                         'game_timeout': game_timeout, 'board_limits': board_limits, 'occlusion': occlusion,
+                         'n_blue': n_blue, 'n_red': n_red, 'formation_spacing': formation_spacing,
+                         'simultaneous': simultaneous, 'pilot_workers': pilot_workers,
+                         'stream_replies': stream_replies, 'debrief_max_tokens': debrief_max_tokens,
+                         'keep_files': keep_files}
+        self.fork_ids = itertools.count(1)
+        self.temperature = temperature
+        # per-game counters and histograms for model calls and simulation phases
+        self.metrics = MetricsRegistry()
+        # the LM is built on the first pilot call (see lm), so boards that never ask one, such as replays,
+        # import neither the backend nor dspy
+        self._lm = None
+        self._resilient_lm = None
+        # seconds a game may take (including retries) before it is abandoned, None for no limit
+        self.game_timeout = game_timeout
+        self.deadline = None
+        # seeded generator for the board layout so games can be repeated
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        # optional shared limiter on pilot calls (e.g. a TokenBucket shared by every game in a tournament)
+        self.rate_limiter = rate_limiter
+        # pilot replies are streamed and cut off at the first complete action (debriefs at REPLY_CHARS
+        # or debrief_max_tokens), instead of waiting for whole completions that get truncated anyway
+        self.stream_replies = stream_replies
+        self.debrief_max_tokens = debrief_max_tokens
+        self.step_num = 0 # initialize step timer (+1 per resolved action, or per round of simultaneous actions)
+        self.turns_played = 0
+        self.acted = set() # indices of the tanks that have acted in the current turn
+        self.game_end = 'Continue'
+        self.keep_files = keep_files
+        if not keep_files:
+            self.save_folder = None
+        elif save_folder is not None:
+            # continue writing into an existing game folder (see resume)
+            self.save_folder = save_folder
+            os.makedirs(self.save_folder, exist_ok=True)
+        else:
+            # grab timestamp for writing to folder
+            ts_format = str(datetime.datetime.now()).replace('-','_').replace(' ','T').replace(':','').split('.')[0]
+            self.save_folder = 'sim_temperature_{}_'.format(self.temperature) + ts_format
+            if tag:
+                self.save_folder += '_' + tag
+            # boards started within the same second (e.g. replays) get a numbered folder
+            base_folder = self.save_folder
+            n_folder = 1
+            while True:
+                try:
+                    os.makedirs(self.save_folder)
+                    break
+                except FileExistsError:
+                    n_folder += 1
+                    self.save_folder = base_folder + '_{}'.format(n_folder)
+        # each board logs to its own file so games can run side by side
+        board_id = next(_board_ids)
+        self.logger = logging.LoggerAdapter(GAME_LOG, {'board': board_id})
+        self.logging_file = None
+        self.log_handler = None
+        if keep_files:
+            self.logging_file = os.path.join(self.save_folder,'log.txt')
+            self.log_handler = logging.FileHandler(self.logging_file, encoding='utf-8')
+            self.log_handler.addFilter(lambda record: getattr(record, 'board', None) == board_id)
+            GAME_LOG.addHandler(self.log_handler)
+        # define limits of rectangular board [-x, x, -y, y] in meters
+        self.board_limits = list(board_limits)
+        # define random location of grove(s) of trees [x, y], unless a layout (grove_xy, grove_r) is given
+        self.n_grove = n_grove if groves is None else len(groves[1])
+        self.grove_xy = [] if groves is None else [list(xy) for xy in groves[0]]
+        self.grove_r = [] if groves is None else list(groves[1])
+        # obstacles go anywhere but the outer tenth of the board on each side
+        x_span = self.board_limits[1] - self.board_limits[0]
+        y_span = self.board_limits[3] - self.board_limits[2]
+        x_lo = self.board_limits[0] + 0.1*x_span
+        y_lo = self.board_limits[2] + 0.1*y_span
+        for ii in range(self.n_grove if groves is None else 0):
+            # choose random location
+            self.grove_xy.append([self.rng.random()*0.8*x_span + x_lo, self.rng.random()*0.8*y_span + y_lo])
+            # choose random grove size (radius)
+            self.grove_r.append(self.rng.random()*50 + 50)
+        # self.grove_xy = [[-200, -200], [100, -350], [0, 0], [150, 150]]
+        # # define grove radii
+        # self.grove_r = [50, 50, 50, 50]
+        # boulders block sight and shots but give no cover; placed after the groves so seeds keep their groves
+        self.rock_xy = [] if rocks is None else [list(xy) for xy in rocks[0]]
+        self.rock_r = [] if rocks is None else list(rocks[1])
+        for ii in range(n_rocks if rocks is None else 0):
+            self.rock_xy.append([self.rng.random()*0.8*x_span + x_lo, self.rng.random()*0.8*y_span + y_lo])
+            self.rock_r.append(self.rng.random()*20 + 10)
+        # with occlusion, groves also block sight and shots (boulders always do)
+        self.occlusion = occlusion
+        self.blocking_kinds = (KIND_GROVE, KIND_ROCK) if occlusion else (KIND_ROCK,)
+        self.has_blockers = occlusion or len(self.rock_r) > 0
+        self.settings.update(groves=(self.grove_xy, self.grove_r), rocks=(self.rock_xy, self.rock_r))
+        # spatial index over groves then boulders, so view and line-of-sight queries only touch nearby cells
+        self.obstacles = ObstacleGrid(np.array(self.grove_xy + self.rock_xy, dtype=float).reshape(-1, 2),
+                                      self.grove_r + self.rock_r,
+                                      [KIND_GROVE]*len(self.grove_r) + [KIND_ROCK]*len(self.rock_r))
+        # initialize the blue and red teams, each lined up along its own edge
+        self.formation_spacing = formation_spacing
+        self.teams = {}
+        for team, n_tanks in (('blue', n_blue), ('red', n_red)):
+            self.teams[team] = [Tank(team, constrained_actions, self.board_limits,
+                                     (ii - (n_tanks - 1)/2)*formation_spacing,
+                                     team if n_tanks == 1 else '{}{}'.format(team, ii + 1))
+                                for ii in range(n_tanks)]
+        self.tanks = self.teams['blue'] + self.teams['red']
+        for ii, tank in enumerate(self.tanks):
+            tank.index = ii
+        self.tank_named = {tank.name: tank for tank in self.tanks}
+        self.team_game = len(self.tanks) > 2
+        # team battles resolve every tank's action of a turn at once; one-on-one games alternate by default
+        self.simultaneous = self.team_game if simultaneous is None else simultaneous
+        # pilots acting in the same step are asked concurrently, on up to pilot_workers threads
+        self.pilot_workers = pilot_workers
+        self.pilot_pool = None
+        # board images are drawn by background workers; a board without a shared pipeline gets its own,
+        # and a board that draws nothing (no images, no animation) needs none
+        self.render_every = render_every # write a PNG every render_every steps (0 for none)
+        self.animation = animation # 'gif' or 'mp4' to export the whole game at the end
+        self.owns_render_pipeline = render_pipeline is None and bool(render_every or animation is not None)
+        self.render_pipeline = RenderPipeline(n_workers=1, metrics=self.metrics) if self.owns_render_pipeline else render_pipeline
+        if not keep_files:
+            self.render_pipeline = None
+        if self.render_pipeline is not None:
+            self.render_pipeline.register_board(self.save_folder, self.grove_xy, self.grove_r, self.board_limits,
+                                                self.rock_xy, self.rock_r, keep_snapshots=animation is not None)
+        # save initial battleground image
+        self.write_board_image()
+        # initialize the transcripts; prompts keep the last recent_turns turns verbatim within token_budget
+        intro = {}
+        for team, n_allies, n_enemies in (('blue', n_blue, n_red), ('red', n_red, n_blue)):
+            if self.team_game:
+                intro[team] = 'You are the pilot of one of {} allied tanks that are about '.format(n_allies) + \
+                    'to engage in combat with {} adversary tanks. The battlefield is a flat plain encircled by an impassable river. '.format(n_enemies) + \
+                    'You know the enemy tanks are at the other end of the battlefield but cannot see where they are because of fog. '
+            else:
+                intro[team] = 'You are the pilot of a tank that is about ' + \
+                    'to engage in combat with an adversary tank. The battlefield is a flat plain encircled by an impassable river. ' + \
+                    'You know the other tank is at the other end of the battlefield but cannot see where it is because of fog. '
+        pilot_init_1 = 'Somewhere near the middle, there are small groves of trees with thick underbrush where a tank would be able to hide. ' + \
+            'You hear your Captain''s voice coming through the radio: \n'
+        pilot_init_2 = '...\n\nYour Captain''s voice fades into static.\n' + \
+            'Your must consider your Captain''s orders and take one of the following possible actions. ' + \
+            'You can turn left or right up to 45 degrees, move forward or backward up to 50 m, or fire your turret.\n'
+        orders = {'blue': order_text(blue_order), 'red': order_text(red_order)}
+        for tank, obs in zip(self.tanks, self.get_observations(self.tanks)):
+            tank.transcript = PilotTranscript(intro[tank.team] + pilot_init_1 + orders[tank.team] + pilot_init_2 + obs,
+                                              recent_turns=recent_turns, token_budget=token_budget)
+        # binary trace of every step, enough to rebuild the board at any step without the LLM
+        self.trace = None
+        if write_trace:
+            header = {'temperature': float(self.temperature), 'seed': self.seed,
+                      'orders': [orders['blue'], orders['red']], 'tanks': [tank.name for tank in self.tanks],
+                      'teams': [tank.team for tank in self.tanks], 'formation_spacing': float(formation_spacing),
+                      'simultaneous': self.simultaneous,
+                      'board_limits': self.board_limits, 'grove_xy': [[float(v) for v in xy] for xy in self.grove_xy],
+                      'grove_r': [float(r) for r in self.grove_r],
+                      'rock_xy': [[float(v) for v in xy] for xy in self.rock_xy],
+                      'rock_r': [float(r) for r in self.rock_r], 'occlusion': occlusion, 'recent_turns': recent_turns,
+                      'token_budget': token_budget, 'constrained_actions': constrained_actions}
+            self.trace = TraceWriter(os.path.join(self.save_folder, 'trace.bin'), header)
+            self.trace.write(0, NO_ACTOR, '', self.tank_states())
+
+    @classmethod
+    def replay(cls, trace_path, step=None, draw_steps=True, **board_kwargs) -> 'SimulationBoard':
+        """Rebuild the board recorded in a trace, as it was after ``step`` (default: the last step).
+
+        The recorded actions are fed back through resolve_actions (all actions of a simultaneous
+        step together), so no model calls are made. With ``draw_steps=False`` the replayed steps
+        are not drawn as images (they still go into the animation). Unless given a render setting
+        or a folder, the replayed board keeps no files: it makes no folder and opens no log.
+        """
+        reader = TraceReader(trace_path)
+        try:
+            header = reader.header
+            board_kwargs.setdefault('render_every', 0)
+            board_kwargs.setdefault('write_trace', False)
+            board_kwargs.setdefault('keep_files', bool(board_kwargs['render_every'] or board_kwargs['write_trace']
+                                                       or board_kwargs.get('animation') is not None
+                                                       or board_kwargs.get('save_folder') is not None))
+            board_kwargs.setdefault('tag', 'replay')
+            # the teams and turn order always come from the trace
+            for key in ('n_blue', 'n_red', 'formation_spacing', 'simultaneous'):
+                board_kwargs.pop(key, None)
+            teams = header.get('teams', ['blue', 'red'])
+            board = cls(header['orders'][0], header['orders'][1], temperature=header['temperature'], seed=header['seed'],
+                        groves=(header['grove_xy'], header['grove_r']), board_limits=header['board_limits'],
+                        rocks=(header.get('rock_xy', []), header.get('rock_r', [])),
+                        occlusion=header.get('occlusion', False), recent_turns=header['recent_turns'],
+                        token_budget=header['token_budget'], constrained_actions=header['constrained_actions'],
+                        n_blue=teams.count('blue'), n_red=teams.count('red'),
+                        formation_spacing=header.get('formation_spacing', 60.0),
+                        simultaneous=header.get('simultaneous', False), **board_kwargs)
+            render_every = board.render_every
+            if not draw_steps:
+                board.render_every = 0
+            moves = []
+            for n in range(1, len(reader)):
+                record = reader[n]
+                if step is not None and record.step > step:
+                    break
+                if moves and record.step != moves[-1][0]:
+                    board.resolve_actions([move[1:] for move in moves])
+                    moves = []
+                moves.append((record.step, board.tanks[record.actor], record.action, record.latency, record.prompt_tokens,
+                              record.completion_tokens))
+            if moves:
+                board.resolve_actions([move[1:] for move in moves])
+            board.render_every = render_every
+        finally:
+            reader.close()
+        return board
+
+    @classmethod
+    def resume(cls, trace_path, **board_kwargs) -> 'SimulationBoard':
+        """Rebuild an interrupted game from its trace and keep playing it in the same folder.
+
+        The recorded steps are replayed without model calls or images, then the trace is reopened
+        for appending, so ``play_game`` continues from the last completed step.
+        """
+        board_kwargs.setdefault('render_every', 1)
+        board_kwargs.pop('tag', None)
+        board = cls.replay(trace_path, draw_steps=False, save_folder=os.path.dirname(trace_path) or '.',
+                           write_trace=False, **board_kwargs)
+        board.trace = TraceWriter.reopen(trace_path)
+        board.logger.info('Resuming game from step {}\n'.format(board.step_num))
+        return board
+
+    def snapshot(self) -> 'BoardState':
+        return BoardState(self)
+
+    def restore(self, state) -> None:
+        """Put the board back into a state taken with ``snapshot`` (of this board or an identical one).
+
+        Boards writing a trace cannot be restored, since their trace would no longer replay;
+        use ``fork`` to branch those.
+        """
+        if self.trace is not None:
+            raise ValueError('cannot restore a board that writes a trace, fork it instead')
+        if len(state.tanks) != len(self.tanks):
+            raise ValueError('state has {} tanks, board has {}'.format(len(state.tanks), len(self.tanks)))
+        self.step_num = state.step_num
+        self.turns_played = state.turns_played
+        self.acted = set(state.acted)
+        self.game_end = state.game_end
+        for tank, (x, y, heading, hidden, alive), last_action, transcript in zip(
+                self.tanks, state.tanks.tolist(), state.last_actions, state.transcripts):
+            tank.loc_xy = [x, y]
+            tank.heading = heading
+            tank.hidden = bool(hidden)
+            tank.alive = bool(alive)
+            tank.last_action = last_action
+            tank.transcript.restore(transcript)
+        self.rng.bit_generator.state = state.rng_state
+
+    def fork(self, state=None, **board_kwargs) -> 'SimulationBoard':
+        """New board in the current state of this one (or in ``state``), e.g. to try other actions or temperatures.
+
+        The layout and settings are copied, with ``board_kwargs`` overriding them (e.g.
+        ``temperature``), and the state is restored from a snapshot, so no turns are replayed and
+        forks share the transcript records played so far. Forks log into a subfolder of this
+        board's folder (if it keeps files) and write no trace or images unless given a render setting.
+        """
+        if board_kwargs.get('write_trace'):
+            raise ValueError('forked boards cannot write a trace')
+        save_folder = None
+        if self.keep_files:
+            save_folder = os.path.join(self.save_folder, 'fork_{}'.format(next(self.fork_ids)))
+        settings = dict(self.settings, save_folder=save_folder, render_every=0)
+        settings.update(board_kwargs, write_trace=False)
+        board = SimulationBoard(**settings)
+        board.restore(self.snapshot() if state is None else state)
+        return board
+
+    @property
+    def lm(self):
+        # apply temperature to LLMs; backend_options go to the backend (e.g. latency or error_rate for 'mock');
+        # a cache serves repeated prompts (e.g. opening turns of games with identical seeds) from disk
+        if self._lm is None:
+            settings = self.settings
+            self._lm, self._resilient_lm = build_lm(settings['backend'], self.temperature, self.metrics,
+                                                    settings['cache'], settings['retry_policy'],
+                                                    **(settings['backend_options'] or {}))
+        return self._lm
+
+    @property
+    def resilient_lm(self):
+        # retrying layer of lm, whose deadline play_game sets
+        if self._resilient_lm is None:
+            self.lm
+        return self._resilient_lm
+
+    @property
+    def blue_tank(self) -> Tank:
+        # lead tank of each team (the only one in a one-on-one game)
+        return self.teams['blue'][0]
+
+    @property
+    def red_tank(self) -> Tank:
+        return self.teams['red'][0]
+
+    def tank_states(self) -> list:
+        return [(tank.loc_xy[0], tank.loc_xy[1], tank.heading, tank.hidden, tank.alive) for tank in self.tanks]
+
+    @property
+    def blue_prompt(self) -> str:
+        return self.blue_tank.transcript.full_text()
+
+    @property
+    def red_prompt(self) -> str:
+        return self.red_tank.transcript.full_text()
+
+    def update_board(self, actor='blue', action='move forward 50 m', latency=0.0, prompt_tokens=0, completion_tokens=0) -> str:
+        # a single tank (given by name or index) acts and its outcome is resolved right away
+        tank = self.tanks[actor] if isinstance(actor, int) else self.tank_named[actor]
+        return self.resolve_actions([(tank, action, latency, prompt_tokens, completion_tokens)])
+
+    def resolve_actions(self, moves) -> str:
+        """Apply the actions of every tank acting in this step and resolve them together.
+
+        ``moves`` holds (tank, action, latency, prompt_tokens, completion_tokens) per acting tank.
+        All tanks move first, then every shot is taken against the new positions (a tank hit in
+        this step still gets its own shot off), then tanks in the river sink. Each action gets a
+        trace record, all with the same step number.
+        """
+        tanks = [move[0] for move in moves]
+        if self.turn_complete():
+            self.turns_played += 1
+            self.acted = set()
+        self.acted.update(tank.index for tank in tanks)
+        with self.metrics.time('phase_seconds', phase='parse'):
+            parsed_actions = [parse_action(move[1]) for move in moves]
+        # update tank status
+        with self.metrics.time('phase_seconds', phase='physics'):
+            status = [tank.update_status(parsed_action) for tank, parsed_action in zip(tanks, parsed_actions)]
+        # collect the messages resulting from each action
+        events = [[] for _ in moves]
+        fire = [FIRE_NONE]*len(moves)
+        destroyed = []
+        for ii, (tank, (fired, _)) in enumerate(zip(tanks, status)):
+            if fired:
+                result, fire[ii], target = self.check_fire_hit(tank)
+                events[ii].append(result + '\n')
+                if target is not None:
+                    destroyed.append(target)
+        shot = list(destroyed)
+        for ii, tank in enumerate(tanks):
+            result = self.check_board_limits(tank)
+            if 'sink in the murky depths' in result:
+                events[ii].append(result + '\n')
+                destroyed.append(tank)
+        for tank in destroyed:
+            tank.alive = False
+        # test victory conditions
+        game_end = self.check_game_end()
+        observations = {}
+        if game_end == 'Continue':
+            # the surviving tanks that acted look around, all on the same board state
+            observers = [tank for tank in tanks if tank.alive]
+            observations = dict(zip([tank.index for tank in observers], self.get_observations(observers)))
+            for tank in self.tanks:
+                if tank in shot and tank not in tanks:
+                    tank.transcript.add_note('Your tank has been hit by an enemy shot and destroyed.\n')
+        for ii, (tank, (fired, parsed)) in enumerate(zip(tanks, status)):
+            obs = observations.get(tank.index, '')
+            if game_end == 'Continue' and tank in shot:
+                events[ii].append('Your tank has been hit by an enemy shot and destroyed.\n')
+            elif obs:
+                # test for mis-parsed input
+                if not parsed:
+                    events[ii].append('Sorry, that action was not understood. Please choose from the list of possible actions above.\n')
+                if 'You are currently hidden' in obs:
+                    tank.hidden = True
+            # record the turn in the transcript
+            tank.transcript.add_turn(moves[ii][1], events[ii], obs, fired, parsed)
+
+        # write the board state to image
+        self.step_num += 1
+        self.game_end = game_end
+        self.write_board_image([tank.index for tank, (fired, _) in zip(tanks, status) if fired],
+                               [tank.index for tank, (_, parsed) in zip(tanks, status) if not parsed],
+                               final=game_end != 'Continue')
+        if self.trace is not None:
+            with self.metrics.time('phase_seconds', phase='trace'):
+                states = self.tank_states()
+                for (tank, action, latency, prompt_tokens, completion_tokens), tank_fire in zip(moves, fire):
+                    self.trace.write(self.step_num, tank.index, action, states, tank_fire, game_end_code(game_end),
+                                     latency, prompt_tokens, completion_tokens)
+
+        return game_end
+
+    def turn_complete(self) -> bool:
+        # a new turn starts once every surviving tank has acted in the current one
+        return not self.acted or all(tank.index in self.acted for tank in self.tanks if tank.alive)
+
+    def next_actors(self, n_turns=None) -> list:
+        # tanks acting in the next step: every waiting tank at once, or one after the other in alternating
+        # games; none once the game is over or n_turns turns are complete
+        if self.game_end != 'Continue':
+            return []
+        if self.turn_complete():
+            if n_turns is not None and self.turns_played >= n_turns:
+                return []
+            waiting = [tank for tank in self.tanks if tank.alive]
+        else:
+            waiting = [tank for tank in self.tanks if tank.alive and tank.index not in self.acted]
+        return waiting if self.simultaneous else waiting[:1]
+
+    def check_game_end(self) -> str:
+        blue_alive = any(tank.alive for tank in self.teams['blue'])
+        red_alive = any(tank.alive for tank in self.teams['red'])
+        if blue_alive and red_alive:
+            return 'Continue'
+        if blue_alive:
+            return 'Blue victory!'
+        if red_alive:
+            return 'Red victory!'
+        return 'Draw! Both sides have been destroyed.'
+
+    def get_observation(self, tank) -> str:
+        return self.get_observations([tank])[0]
+
+    @timed_phase('observation')
+    def get_observations(self, tanks) -> list:
+        # build the observations of several tanks; large battles get the tank-to-tank geometry in one pass
+        if len(tanks)*len(self.tanks) <= SMALL_BATTLE:
+            sightings = [self.tank_sightings(tank) for tank in tanks]
+        else:
+            sightings = self.batch_sightings(tanks)
+        return [self.observation_text(tank, enemies, friends) for tank, (enemies, friends) in zip(tanks, sightings)]
+
+    def tank_sightings(self, tank) -> tuple:
+        # (distance, bearing) of the enemy and friendly tanks in view of tank, nearest first
+        enemies, friends = [], []
+        for other in self.tanks:
+            if other is tank or not other.alive or other.hidden:
+                continue
+            dist = np.sqrt(np.square(np.abs(tank.loc_xy[0] - other.loc_xy[0])) +
+                           np.square(np.abs(tank.loc_xy[1] - other.loc_xy[1])))
+            angle = 90 - np.rad2deg(np.arctan2(other.loc_xy[1] - tank.loc_xy[1], other.loc_xy[0] - tank.loc_xy[0])) # converted to 0=N, 90=E
+            if (dist <= tank.viewing_radius and np.abs(tank.heading - angle) <= tank.viewing_hwidth
+                    and self.line_of_sight(tank.loc_xy, other.loc_xy)):
+                (enemies if other.team != tank.team else friends).append((int(dist), angle))
+        return sorted(enemies, key=lambda sighting: sighting[0]), sorted(friends, key=lambda sighting: sighting[0])
+
+    def batch_sightings(self, tanks) -> list:
+        # tank_sightings for many tanks, with distances, bearings and viewing cones as (observers, tanks) arrays
+        xy = np.array([other.loc_xy for other in self.tanks], dtype=float)
+        view = np.array([(tank.heading, tank.viewing_radius, tank.viewing_hwidth) for tank in tanks], dtype=float)
+        observer = np.array([tank.index for tank in tanks])
+        delta = xy - xy[observer][:, None]
+        dist = np.sqrt(np.square(np.abs(delta)).sum(axis=2))
+        angle = 90 - np.rad2deg(np.arctan2(delta[..., 1], delta[..., 0]))
+        # tanks in the viewing cone that are alive, not hidden and not the observer itself
+        seen = ((dist <= view[:, 1:2]) & (np.abs(view[:, 0:1] - angle) <= view[:, 2:3])
+                & np.array([other.alive and not other.hidden for other in self.tanks])
+                & (np.arange(len(self.tanks)) != observer[:, None]))
+        sightings = []
+        for row, tank in enumerate(tanks):
+            visible = np.flatnonzero(seen[row])
+            if self.has_blockers and len(visible):
+                visible = visible[self.obstacles.lines_clear(tank.loc_xy, xy[visible], self.blocking_kinds)]
+            enemies, friends = [], []
+            # nearest first
+            visible = visible[np.argsort(dist[row, visible], kind='stable')]
+            for jj, dist_j, angle_j in zip(visible.tolist(), dist[row, visible].tolist(), angle[row, visible].tolist()):
+                (enemies if self.tanks[jj].team != tank.team else friends).append((int(dist_j), angle_j))
+            sightings.append((enemies, friends))
+        return sightings
+
+    def observation_text(self, tank, enemies, friends) -> str:
+        # build observations encoded into a message; enemies and friends are (distance, bearing) of visible tanks
+        obs = '\nHere is the current battlefield status. '
+        # test if the gameboard edge is nearby (doesn't need to be within view)
+        if np.abs(tank.loc_xy[1] - self.board_limits[2]) <= tank.viewing_radius-10:
+            obs += 'There is an impassible river {} m away, {}. '.format(
+                int(np.abs(tank.loc_xy[1] - self.board_limits[2])), self.get_dir_str(180 - tank.heading))
+        if np.abs(tank.loc_xy[1] - self.board_limits[3]) <= tank.viewing_radius-10:
+            obs += 'There is an impassible river {} m away, {}. '.format(
+                int(np.abs(tank.loc_xy[1] - self.board_limits[3])), self.get_dir_str(-tank.heading))
+        if np.abs(tank.loc_xy[0] - self.board_limits[0]) <= tank.viewing_radius-10:
+            obs += 'There is an impassible river {} m away, {}. '.format(
+                int(np.abs(tank.loc_xy[0] - self.board_limits[0])), self.get_dir_str(-tank.heading - 90))
+        if np.abs(tank.loc_xy[0] - self.board_limits[1]) <= tank.viewing_radius-10:
+            obs += 'There is an impassible river {} m away, {}. '.format(
+                int(np.abs(tank.loc_xy[0] - self.board_limits[1])), self.get_dir_str(-tank.heading + 90))
+        # other tanks within view
+        if not self.team_game:
+            if enemies:
+                obs += 'You see the enemy tank {} m away, {}! '.format(
+                    enemies[0][0], self.get_dir_str(enemies[0][1] - tank.heading))
+            else:
+                obs += 'You don''t see the enemy tank. '
+        else:
+            for dist, angle in enemies:
+                obs += 'You see an enemy tank {} m away, {}! '.format(dist, self.get_dir_str(angle - tank.heading))
+            if not enemies:
+                obs += 'You don''t see any enemy tanks. '
+            for dist, angle in friends:
+                obs += 'You see a friendly tank {} m away, {}. '.format(dist, self.get_dir_str(angle - tank.heading))
+        # test if any groves of trees (or boulders) are in view, looking only at nearby cells of the index
+        in_view, dists, angles = self.obstacles.in_view(tank.loc_xy, tank.heading, tank.viewing_radius,
+                                                        tank.viewing_hwidth)
+        # with blockers on the board, sight lines to everything in view are checked in one pass
+        clear = [True]*len(in_view)
+        if self.has_blockers:
+            clear = self.obstacles.lines_clear(tank.loc_xy, self.obstacles.xy[in_view], self.blocking_kinds,
+                                               in_view).tolist()
+        for ii, dist, angle, visible in zip(in_view.tolist(), dists.tolist(), angles.tolist(), clear):
+            is_grove = ii < len(self.grove_r) # groves come first in the index
+            if is_grove and dist <= self.grove_r[ii]:
+                obs += 'You are currently hidden inside a dense grove of trees. '
+            elif not visible:
+                continue
+            elif is_grove:
+                obs += 'You see a dense grove of trees {} m away, {}. '.format(
+                    int(dist), self.get_dir_str(angle - tank.heading))
+            else:
+                obs += 'You see a large boulder {} m away, {}. '.format(
+                    int(dist), self.get_dir_str(angle - tank.heading))
+        obs += 'You see nothing else in the fog.\nPlease take one of the above possible actions now.\n'
+
+        return obs
+
+    def line_of_sight(self, from_xy, to_xy, exclude=None) -> bool:
+        # clear unless a boulder (or, with occlusion, a grove) lies between the two points
+        if not self.has_blockers:
+            return True
+        return self.obstacles.line_of_sight(from_xy, to_xy, self.blocking_kinds, exclude)
+
+    def get_dir_str(self, direction) -> str:
+        dir = np.remainder(direction, 360)
+        if dir > 358 or dir < 2:
+            dir_str = 'in front of you'
+        elif dir > 182:
+            dir_str = 'at {} degrees to your left'.format(int(360-dir))
+        elif dir > 178:
+            dir_str = 'behind you'
+        elif dir >= 2:
+            dir_str = 'at {} degrees to your right'.format(int(dir))
+        return dir_str
+    
+    @timed_phase('physics')
+    def check_fire_hit(self, tank) -> tuple:
+        # the shell flies along the heading and meets the nearest enemy tank lined up with it; returns the
+        # message, the FIRE_* outcome and the tank that was hit (or None)
+        enemies = [other for other in self.tanks if other.team != tank.team and other.alive]
+        xy = np.array([enemy.loc_xy for enemy in enemies], dtype=float).reshape(-1, 2)
+        # compute distance to each enemy tank and difference between heading and vector to the enemy tank
+        dx = xy[:, 0] - tank.loc_xy[0]
+        dy = xy[:, 1] - tank.loc_xy[1]
+        dists = np.sqrt(np.square(np.abs(dx)) + np.square(np.abs(dy)))
+        angles = 90 - np.rad2deg(np.arctan2(dy, dx)) # converted to 0=N, 90=E
+        aligned = np.flatnonzero(dists*np.abs(tank.heading - angles) <= 1000.0)
+        if not len(aligned):
+            return 'Your shot whizzes through the air, missing the enemy tank.', FIRE_MISS, None
+        target = aligned[np.argmin(dists[aligned])]
+        enemy_tank, dist = enemies[target], dists[target]
+
+        # an obstacle between the tanks (within the 400 m range of the shell) stops an aimed shot
+        blocker = None
+        if self.has_blockers:
+            start = np.array(tank.loc_xy, dtype=float)
+            end = start + (np.array(enemy_tank.loc_xy, dtype=float) - start)*min(1.0, 400.0/max(dist, 1e-9))
+            blockers = self.obstacles.blocking(start, end, self.blocking_kinds)
+            if len(blockers):
+                blocker = blockers[np.argmin(np.hypot(*(self.obstacles.xy[blockers] - start).T))]
+
+        # test victory condition - must be within 10 degrees at 100 m distance, and within 400 m distance total
+        if blocker is not None:
+            return 'Your shot slams into {} before reaching the enemy tank.'.format(
+                'a grove of trees' if self.obstacles.kind[blocker] == KIND_GROVE else 'a large boulder'), FIRE_BLOCKED, None
+        if dist > 400.0:
+            return ('Your shot whizzes towards the enemy tank, but falls short and hits the ground. You need to get closer.',
+                    FIRE_SHORT, None)
+        if self.team_game:
+            return 'Your shot strikes an enemy tank and destroys it!', FIRE_HIT, enemy_tank
+        return 'Your shot strikes the enemy tank! You win!', FIRE_HIT, enemy_tank
+
+    @timed_phase('physics')
+    def check_board_limits(self, tank) -> str:
+        if (tank.loc_xy[0] < self.board_limits[0] or 
+            tank.loc_xy[0] > self.board_limits[1] or
+            tank.loc_xy[1] < self.board_limits[2] or
+            tank.loc_xy[1] > self.board_limits[3]):
+            result = 'You have crossed into the river and sink in the murky depths. You lose!'
+        else:
+            result = ''
+        return result
+        
+    @timed_phase('render_submit')
+    def write_board_image(self, fired=(), not_understood=(), final=False) -> None:
+        # hand a snapshot of the board to the render workers instead of drawing in the game loop;
+        # fired and not_understood are indices of the tanks whose action fired or was not understood
+        if self.render_pipeline is None:
+            return
+        snapshot = BoardSnapshot(self.step_num,
+                                 tuple(TankSnapshot(tank.loc_xy[0], tank.loc_xy[1], tank.heading,
+                                                    tank.viewing_radius, tank.viewing_hwidth, tank.team[0],
+                                                    tank.index in fired, tank.index not in not_understood, tank.alive)
+                                       for tank in self.tanks))
+        path = None
+        if self.render_every and (final or self.step_num % self.render_every == 0):
+            path = os.path.join(self.save_folder,'board_step_{}.png'.format(self.step_num))
+        self.render_pipeline.submit(self.save_folder, snapshot, path, final)
+
+    def finish_rendering(self) -> None:
+        if self.render_pipeline is None:
+            return
+        animation_path = None
+        if self.animation is not None:
+            animation_path = os.path.join(self.save_folder, 'game.{}'.format(self.animation))
+        # a decided game drew its final frame at full resolution when it ended; one stopped at the turn limit
+        # (or timed out) gets its last step drawn that way now
+        final_path = None
+        if self.render_every and self.game_end == 'Continue':
+            final_path = os.path.join(self.save_folder,'board_step_{}.png'.format(self.step_num))
+        self.render_pipeline.finish(self.save_folder, animation_path, final_path)
+        if self.owns_render_pipeline:
+            self.render_pipeline.shutdown()
+
+    def wait_for_pilot_slot(self) -> None:
+        # hold off on the next model call until the shared rate limiter allows it
+        if self.rate_limiter is not None:
+            self.metrics.observe('rate_limit_wait_seconds', self.rate_limiter.acquire())
+
+    def check_deadline(self) -> None:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise GameTimeoutError('game exceeded its {} s timeout at step {}'.format(self.game_timeout, self.step_num))
+
+    def ask_pilot(self, tank, debrief=False) -> tuple:
+        # rate-limited, timed pilot call; returns the completion, its latency and the prompt size
+        self.wait_for_pilot_slot()
+        # time to action runs from here, so waits on the rate limiter are left out
+        asked = time.monotonic()
+        self.check_deadline()
+        prompt = tank.transcript.build_prompt()
+        if debrief:
+            stop, config = _debrief_stop, ({} if self.debrief_max_tokens is None else {'max_tokens': self.debrief_max_tokens})
+        else:
+            stop, config = _action_stop, {}
+        calls = self.lm.calls_in_thread()
+        start = time.monotonic()
+        with self.metrics.time('phase_seconds', phase='pilot'), stream_until(stop if self.stream_replies else None):
+            response = tank.pilot(intent_and_status = prompt, config = config)
+        latency = time.monotonic() - start
+        self.metrics.inc('pilot_calls_total')
+        # dspy re-asks the LM when a completion is missing the output field
+        self.metrics.inc('pilot_retries_total', max(0, self.lm.calls_in_thread() - calls - 1))
+        reply = response.values()[0]
+        # backends that cannot stream return whole replies; cut them where a streamed reply would have stopped
+        end = stop(reply) if self.stream_replies else None
+        reply = reply if end is None else reply[:end]
+        if not debrief:
+            self.metrics.observe('pilot_time_to_action_seconds', time.monotonic() - asked)
+        return reply, latency, tank.transcript.prompt_tokens[-1]
+
+    def ask_pilots(self, tanks, debrief=False) -> list:
+        # pilots acting in the same step are asked in one concurrent round, which overlaps their model latency
+        if len(tanks) == 1 or not self.simultaneous:
+            return [self.ask_pilot(tank, debrief) for tank in tanks]
+        if self.pilot_pool is None:
+            self.pilot_pool = ThreadPoolExecutor(max_workers=self.pilot_workers or len(self.tanks),
+                                                 thread_name_prefix='pilot')
+        return list(self.pilot_pool.map(self._ask_pilot_with_lm, tanks, [debrief]*len(tanks)))
+
+    def _ask_pilot_with_lm(self, tank, debrief=False) -> tuple:
+        # dspy settings are per thread, so each pilot thread points dspy at this board's LM
+        import dspy
+        with dspy.settings.context(lm=self.lm):
+            return self.ask_pilot(tank, debrief)
+
+    def take_turn(self, tanks, actions=None) -> str:
+        # ask the pilots of tanks for their actions (unless given in actions, by tank name) and resolve them as one step
+        actions = actions or {}
+        asked = [tank for tank in tanks if tank.name not in actions]
+        replies = dict(zip([tank.name for tank in asked], self.ask_pilots(asked)))
+        moves = []
+        for tank in tanks:
+            if tank.name in actions:
+                moves.append((tank, actions[tank.name], 0.0, 0, 0))
+                continue
+            action, latency, prompt_tokens = replies[tank.name]
+            self.logger.info('{} prompt tokens: {}, latency: {:.2f} s'.format(tank.name.capitalize(), prompt_tokens, latency))
+            moves.append((tank, action[:REPLY_CHARS], latency, prompt_tokens, count_tokens(action)))
+        return self.resolve_actions(moves)
+
+    def play_game(self, n_turns=5, verbose=True, actions=None) -> str:
+        # every pilot call goes to this board's LM, so parallel games can use different temperatures;
+        # actions (by tank name) are played on the first step instead of asking those pilots
+        if self.game_timeout is not None:
+            self.deadline = time.monotonic() + self.game_timeout
+            self.resilient_lm.deadline = self.deadline
+        import dspy
+        try:
+            with dspy.settings.context(lm=self.lm):
+                game_end = self._play_game(n_turns, verbose, actions)
+        finally:
+            # a game that timed out or failed keeps its trace up to the last completed step, for resume
+            self.close()
+        return game_end
+
+    def close(self) -> None:
+        # flush the images, trace and log of a finished game
+        if self.pilot_pool is not None:
+            self.pilot_pool.shutdown()
+            self.pilot_pool = None
+        self.finish_rendering()
+        if self.trace is not None:
+            self.trace.close()
+        if self.log_handler is not None:
+            self.metrics.write(os.path.join(self.save_folder, 'metrics'))
+            GAME_LOG.removeHandler(self.log_handler)
+            self.log_handler.close()
+            self.log_handler = None
+
+    def _play_game(self, n_turns, verbose, actions=None) -> str:
+        if verbose:
+            print('\nGame Settings: n_turns = {}, temperature = {}\n\n'.format(n_turns, self.temperature))
+        self.logger.info('\nGame Settings: n_turns = {}, temperature = {}, seed = {}\n\n'.format(n_turns, self.temperature, self.seed))
+        # a resumed game starts from its last completed step, possibly part way through a turn;
+        # a game that was already over (e.g. a fork of a finished game) gets no second debrief
+        decided = self.game_end != 'Continue'
+        while True:
+            tanks = self.next_actors(n_turns)
+            if not tanks:
+                break
+            if self.turn_complete():
+                if verbose:
+                    print('Starting turn {} of {}...'.format(self.turns_played+1, n_turns))
+                self.logger.info('Starting turn {} of {}...'.format(self.turns_played+1, n_turns))
+            self.take_turn(tanks, actions)
+            actions = None
+        game_end = self.game_end
+        if game_end != 'Continue' and not decided:
+            for tank in self.tanks:
+                tank.transcript.add_note('\n' + game_end + '\n')
+
+        # ask the lead tanks of the winning and losing side why they think they won and lost
+        if 'victory' in game_end and not decided:
+            winner, loser = (self.blue_tank, self.red_tank) if 'Blue victory' in game_end else (self.red_tank, self.blue_tank)
+            winner.transcript.add_note('Congratulations on your victory! Please tell your Captain how and why you won the battle. Limit your response to 5 sentences.\n')
+            loser.transcript.add_note('Too bad! Please tell your Captain how and why you lost the battle. Limit your response to 5 sentences.\n')
+            debriefed = [self.blue_tank, self.red_tank]
+            for tank, (response, _, _) in zip(debriefed, self.ask_pilots(debriefed, debrief=True)):
+                tank.transcript.add_note(response[:REPLY_CHARS])
+
+        if verbose:
+            print('\n\nGame Results:\n\n')
+        self.logger.info('\n\nGame Results:\n\n')
+        for tank in self.tanks:
+            if verbose:
+                print('\n\n\nFrom {} tank perspective:\n\n{}\n'.format(tank.name, tank.transcript.full_text()))
+            self.logger.info('\n\n\nFrom {} tank perspective:\n\n{}\n'.format(tank.name, tank.transcript.full_text()))
+        return game_end
@@ -0,0 +1,167 @@
+# uniform grid over circular obstacles (groves, boulders) for local view, concealment and line-of-sight queries
+
+import numpy as np
+
+# obstacle kinds
+KIND_GROVE = 0 # conceals a tank inside it; blocks sight and shots only on boards with occlusion
+KIND_ROCK = 1 # always blocks sight and shots
+
+# below this many obstacles, testing all of them beats looking up cells
+SMALL_MAP = 32
+
+
+def _crossing(w, r, d):
+    """(k, m) mask of circles (centers ``w`` relative to the start point, radii ``r``) cutting the
+    segments from the start point along ``d``, leaving out circles that contain either end.
+
+    Squared distances all come from the one (k, m) projection matrix w.d, which keeps dense
+    sight-line checks cheap.
+    """
+    proj = w @ d.T
+    length2 = np.maximum(np.einsum('ij,ij->i', d, d), 1e-12)
+    w2 = np.einsum('ij,ij->i', w, w)[:, None]
+    r2 = np.square(r)[:, None]
+    t = np.clip(proj/length2, 0, 1)
+    closest2 = w2 - 2*t*proj + t*t*length2
+    end2 = length2 - 2*proj + w2
+    return (closest2 < r2) & (w2 > r2) & (end2 > r2)
+
+
+class ObstacleGrid:
+    """Circular obstacles bucketed into square cells so queries only touch nearby cells.
+
+    Each obstacle is listed in every cell its bounding box overlaps, stored CSR-style
+    (``starts``/``items``) over the flattened grid. Queries return obstacle indices in ascending
+    order, so results (and the observation text built from them) match a full scan.
+    ``cell_size`` defaults to the largest obstacle diameter. Maps with fewer than SMALL_MAP
+    obstacles skip the cell lookup.
+    """
+
+    def __init__(self, xy, r, kind=None, cell_size=None) -> None:
+        self.xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self.r = np.asarray(r, dtype=float).reshape(-1)
+        n = len(self.r)
+        self.kind = np.zeros(n, dtype=np.int8) if kind is None else np.asarray(kind, dtype=np.int8)
+        if cell_size is None:
+            cell_size = 2*self.r.max() if n else 100.0
+        self.cell_size = float(max(cell_size, 1e-6))
+        lo = (self.xy - self.r[:, None]).min(axis=0) if n else np.zeros(2)
+        hi = (self.xy + self.r[:, None]).max(axis=0) if n else np.zeros(2)
+        self.origin = lo
+        self.shape = np.maximum(np.floor((hi - lo)/self.cell_size).astype(int) + 1, 1)
+        # expand every obstacle over the cells of its bounding box
+        i0 = self._cell(self.xy - self.r[:, None])
+        i1 = self._cell(self.xy + self.r[:, None])
+        span = i1 - i0 + 1
+        count = span[:, 0]*span[:, 1]
+        obstacle = np.repeat(np.arange(n), count)
+        local = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        cell = (i0[obstacle, 0] + local//span[obstacle, 1])*self.shape[1] + i0[obstacle, 1] + local % span[obstacle, 1]
+        order = np.argsort(cell, kind='stable')
+        self.items = obstacle[order]
+        self.starts = np.searchsorted(cell[order], np.arange(self.shape[0]*self.shape[1] + 1))
+
+    def __len__(self) -> int:
+        return len(self.r)
+
+    def _cell(self, xy):
+        # integer cell coordinates of points, clipped to the grid
+        return np.clip(np.floor((np.asarray(xy, dtype=float) - self.origin)/self.cell_size).astype(int), 0,
+                       self.shape - 1)
+
+    def _gather(self, cells):
+        # sorted unique obstacles listed in the given flat cell ids
+        cells = np.asarray(cells, dtype=int)
+        begin = self.starts[cells]
+        count = self.starts[cells + 1] - begin
+        position = np.repeat(begin - np.cumsum(count) + count, count) + np.arange(count.sum())
+        return np.unique(self.items[position])
+
+    def candidates_in_box(self, lo, hi):
+        # obstacles whose cells overlap the axis-aligned box [lo, hi]
+        if len(self) < SMALL_MAP:
+            return np.arange(len(self))
+        lo = np.asarray(lo, dtype=float)
+        hi = np.asarray(hi, dtype=float)
+        if np.any(hi < self.origin) or np.any(lo > self.origin + self.shape*self.cell_size):
+            return np.empty(0, dtype=int)
+        (x0, y0), (x1, y1) = self._cell(lo), self._cell(hi)
+        cells = (np.arange(x0, x1 + 1)[:, None]*self.shape[1] + np.arange(y0, y1 + 1)[None, :]).ravel()
+        return self._gather(cells)
+
+    def near(self, center, radius):
+        # obstacles whose edge is within radius of center, with their center distances
+        center = np.asarray(center, dtype=float)
+        idx = self.candidates_in_box(center - radius, center + radius)
+        dist = np.sqrt(np.square(self.xy[idx, 0] - center[0]) + np.square(self.xy[idx, 1] - center[1]))
+        keep = dist - self.r[idx] <= radius
+        return idx[keep], dist[keep]
+
+    def in_view(self, center, heading, radius, hwidth):
+        """Obstacles within a viewing cone, as (indices, distances, bearings), bearings 0=N, 90=E.
+
+        Same test as the original per-grove scan: edge within ``radius`` and bearing within
+        ``hwidth`` of ``heading`` (absolute difference, no wrap-around).
+        """
+        idx, dist = self.near(center, radius)
+        angle = 90 - np.rad2deg(np.arctan2(self.xy[idx, 1] - center[1], self.xy[idx, 0] - center[0]))
+        keep = np.abs(heading - angle) <= hwidth
+        return idx[keep], dist[keep], angle[keep]
+
+    def segment_cells(self, p0, p1):
+        # flat ids of the grid cells crossed by the segment p0-p1 (Amanatides-Woo traversal)
+        g0 = (np.asarray(p0, dtype=float) - self.origin)/self.cell_size
+        g1 = (np.asarray(p1, dtype=float) - self.origin)/self.cell_size
+        cell = np.floor(g0).astype(int)
+        end = np.floor(g1).astype(int)
+        delta = g1 - g0
+        step = np.sign(delta).astype(int)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_max = np.where(delta != 0, (cell + (step > 0) - g0)/delta, np.inf)
+            t_delta = np.where(delta != 0, np.abs(1/delta), np.inf)
+        cells = []
+        for _ in range(int(np.abs(end - cell).sum()) + 1):
+            if 0 <= cell[0] < self.shape[0] and 0 <= cell[1] < self.shape[1]:
+                cells.append(cell[0]*self.shape[1] + cell[1])
+            axis = 0 if t_max[0] < t_max[1] else 1
+            cell[axis] += step[axis]
+            t_max[axis] += t_delta[axis]
+        return cells
+
+    def blocking(self, p0, p1, kinds=(KIND_ROCK,), exclude=None):
+        """Obstacles of the given kinds crossing the segment p0-p1, in ascending order.
+
+        Obstacles containing either end point are ignored (a tank inside a grove can still see
+        and shoot out of it), as is ``exclude`` (e.g. the grove being looked at).
+        """
+        if not len(self):
+            return np.empty(0, dtype=int)
+        p0 = np.asarray(p0, dtype=float)
+        p1 = np.asarray(p1, dtype=float)
+        idx = np.arange(len(self)) if len(self) < SMALL_MAP else self._gather(self.segment_cells(p0, p1))
+        idx = idx[np.isin(self.kind[idx], kinds)]
+        if exclude is not None:
+            idx = idx[idx != exclude]
+        if not len(idx):
+            return idx
+        return idx[_crossing(self.xy[idx] - p0, self.r[idx], (p1 - p0)[None, :])[:, 0]]
+
+    def lines_clear(self, p0, targets, kinds=(KIND_ROCK,), exclude=None):
+        """Boolean mask of which sight lines from p0 to each of ``targets`` (m, 2) are unblocked.
+
+        One vectorized pass over the obstacles near the lines, with the same rules as
+        ``blocking``; ``exclude`` gives, per target, an obstacle index to ignore (or -1).
+        """
+        p0 = np.asarray(p0, dtype=float)
+        targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+        if not len(targets) or not len(self):
+            return np.ones(len(targets), dtype=bool)
+        idx = self.candidates_in_box(np.minimum(p0, targets.min(axis=0)), np.maximum(p0, targets.max(axis=0)))
+        idx = idx[np.isin(self.kind[idx], kinds)]
+        blocked = _crossing(self.xy[idx] - p0, self.r[idx], targets - p0)
+        if exclude is not None:
+            blocked &= idx[:, None] != np.asarray(exclude)[None, :]
+        return ~blocked.any(axis=0)
+
+    def line_of_sight(self, p0, p1, kinds=(KIND_ROCK,), exclude=None) -> bool:
+        return len(self.blocking(p0, p1, kinds, exclude)) == 0
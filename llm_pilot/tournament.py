@@ -0,0 +1,190 @@
+# tournament runner: every combination of orders, temperatures and seeds on a thread pool, with checkpoints
+
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .resilience import GameTimeoutError
+from .simulation import SimulationBoard
+
+class TournamentCheckpoint:
+    """Append-only JSON-lines log of a tournament's games, so an interrupted sweep picks up where it stopped.
+
+    Every game writes a 'started' line with its save folder and a 'finished' line with its result.
+    When the file is loaded again, finished games are taken from it as they are and games that
+    started but never finished are resumed from their traces.
+
+    The first line holds the ``settings`` the games were played with (turn limit, orders, backend,
+    team sizes, ...); games are only keyed on temperature, order index and seed, so a file written
+    with other settings is refused with a ValueError rather than mixed into the new results.
+    """
+
+    def __init__(self, path, settings=None) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.settings = json.loads(json.dumps(settings or {})) # as read back from the file
+        self.started = {} # (temperature, order index, seed) -> save folder
+        self.finished = {} # (temperature, order index, seed) -> result entry
+        text = ''
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        if text.strip():
+            lines = text.splitlines()
+            try:
+                written = json.loads(lines[0])
+            except ValueError:
+                written = {}
+            if written.get('status') != 'settings' or written.get('settings') != self.settings:
+                raise ValueError('Checkpoint {} was written with other settings than this run; '
+                                 'use another checkpoint file'.format(path))
+            for line in lines[1:]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # line torn by the interruption
+                key = (entry['temperature'], entry['order_idx'], entry['seed'])
+                if entry['status'] == 'finished':
+                    self.finished[key] = entry
+                else:
+                    self.started[key] = entry['save_folder']
+            if not text.endswith('\n'):
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write('\n')
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'status': 'settings', 'settings': self.settings}) + '\n')
+
+    def record(self, status, temperature, order_idx, seed, **fields) -> None:
+        entry = {'status': status, 'temperature': temperature, 'order_idx': order_idx, 'seed': seed, **fields}
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+# board options that change how a tournament runs but not how its games are played
+_RUN_ONLY_KWARGS = ('rate_limiter', 'cache', 'render_pipeline', 'animation', 'game_timeout', 'metrics')
+
+def checkpoint_settings(orders, n_turns, board_kwargs) -> dict:
+    # the settings a checkpoint file is only valid for
+    settings = {'n_turns': n_turns, 'orders': [list(order_pair) for order_pair in orders]}
+    for key, value in sorted(board_kwargs.items()):
+        if key not in _RUN_ONLY_KWARGS and isinstance(value, (str, int, float, bool, type(None), list, tuple)):
+            settings[key] = value
+    return settings
+
+def game_outcome(game_end) -> str:
+    # 'blue', 'red' or 'draw' (including games that ran out of turns)
+    if 'Blue victory' in game_end:
+        return 'blue'
+    if 'Red victory' in game_end:
+        return 'red'
+    return 'draw'
+
+def play_tournament_game(config, n_turns, board_kwargs, checkpoint=None) -> dict:
+    # play (or resume) a single game of the tournament and report its outcome
+    temperature, order_idx, (blue_order, red_order), seed = config
+    start = time.monotonic()
+    trace_path = None
+    if checkpoint is not None and (temperature, order_idx, seed) in checkpoint.started:
+        trace_path = os.path.join(checkpoint.started[(temperature, order_idx, seed)], 'trace.bin')
+    if trace_path is not None and os.path.exists(trace_path):
+        board = SimulationBoard.resume(trace_path, **board_kwargs)
+    else:
+        board = SimulationBoard(blue_order, red_order, temperature=temperature, seed=seed,
+                                tag='order{}_seed{}'.format(order_idx, seed), **board_kwargs)
+    if checkpoint is not None:
+        checkpoint.record('started', temperature, order_idx, seed, save_folder=board.save_folder)
+    outcome = game_outcome(board.play_game(n_turns=n_turns, verbose=False))
+    prompt_tokens = sum(sum(tank.transcript.prompt_tokens) for tank in board.tanks)
+    game = {'outcome': outcome, 'turns': board.turns_played, 'seconds': time.monotonic() - start,
+            'prompt_tokens': prompt_tokens, 'save_folder': board.save_folder}
+    if checkpoint is not None:
+        checkpoint.record('finished', temperature, order_idx, seed, **game)
+    game['metrics'] = board.metrics
+    return game
+
+def run_tournament(orders, temperatures, seeds, n_turns=50, max_workers=16, metrics=None, checkpoint=None,
+                   **board_kwargs) -> dict:
+    """Plays every combination of captain orders, temperature and seed on a thread pool.
+
+    ``orders`` is a list of (blue_order, red_order) pairs. Games spend almost all of their time
+    waiting on the model server, so they run concurrently, up to ``max_workers`` at once.
+    ``board_kwargs`` go to every SimulationBoard; pass shared objects such as ``rate_limiter``
+    (a TokenBucket pacing the pilot calls), ``cache`` (a ResponseCache serving repeated prompts)
+    and ``render_pipeline`` (a RenderPipeline drawing all boards). Each game's metrics are merged
+    into ``metrics`` (a MetricsRegistry) when given. With ``checkpoint`` (the path of a
+    TournamentCheckpoint file), games finished by an earlier, interrupted run with the same settings
+    are not replayed and games it left half-played are resumed from their last completed step; a
+    checkpoint written with other settings raises a ValueError. Pass ``game_timeout``
+    to abandon games that take too long. Returns the aggregated results keyed on (temperature,
+    order index); a game that raises or times out is counted as an error instead of stopping the
+    sweep.
+    """
+    configs = [(float(temperature), order_idx, order_pair, seed)
+               for temperature in temperatures
+               for order_idx, order_pair in enumerate(orders)
+               for seed in seeds]
+    results = {}
+    for temperature, order_idx, _, _ in configs:
+        results[(temperature, order_idx)] = {'games': 0, 'blue_wins': 0, 'red_wins': 0, 'draws': 0,
+                                             'errors': 0, 'turns': [], 'seconds': [], 'prompt_tokens': []}
+    def add_game(result, game) -> None:
+        result['games'] += 1
+        if game['outcome'] == 'blue':
+            result['blue_wins'] += 1
+        elif game['outcome'] == 'red':
+            result['red_wins'] += 1
+        else:
+            result['draws'] += 1
+        result['turns'].append(game['turns'])
+        result['seconds'].append(game['seconds'])
+        result['prompt_tokens'].append(game['prompt_tokens'])
+
+    if checkpoint is not None:
+        checkpoint = TournamentCheckpoint(checkpoint, checkpoint_settings(orders, n_turns, board_kwargs))
+        done = [config for config in configs if (config[0], config[1], config[3]) in checkpoint.finished]
+        for temperature, order_idx, _, seed in done:
+            add_game(results[(temperature, order_idx)], checkpoint.finished[(temperature, order_idx, seed)])
+        configs = [config for config in configs if config not in done]
+        if done:
+            print('Skipping {} games finished in an earlier run ({} to resume)'.format(
+                len(done), sum((c[0], c[1], c[3]) in checkpoint.started for c in configs)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(play_tournament_game, config, n_turns, board_kwargs, checkpoint): config
+                   for config in configs}
+        for future in concurrent.futures.as_completed(futures):
+            temperature, order_idx, _, seed = futures[future]
+            result = results[(temperature, order_idx)]
+            try:
+                game = future.result()
+            except Exception as err:
+                result['games'] += 1
+                result['errors'] += 1
+                if metrics is not None:
+                    metrics.inc('games_total', outcome='timeout' if isinstance(err, GameTimeoutError) else 'error')
+                print('Game with temperature = {}, order = {}, seed = {} failed: {!r}'.format(
+                    temperature, order_idx, seed, err))
+                continue
+            add_game(result, game)
+            if metrics is not None:
+                metrics.merge(game['metrics'])
+                metrics.inc('games_total', outcome=game['outcome'])
+            print('Finished game with temperature = {}, order = {}, seed = {}: {} in {} turns'.format(
+                temperature, order_idx, seed, game['outcome'], game['turns']))
+    for result in results.values():
+        result['mean_turns'] = float(np.mean(result['turns'])) if result['turns'] else float('nan')
+        result['mean_seconds'] = float(np.mean(result['seconds'])) if result['seconds'] else float('nan')
+        result['mean_prompt_tokens'] = float(np.mean(result['prompt_tokens'])) if result['prompt_tokens'] else float('nan')
+    return results
+
+def print_tournament_summary(results) -> None:
+    print('\nTournament Results:\n')
+    print('temperature  order  games  blue  red  draw  error  mean turns  mean prompt tokens')
+    for (temperature, order_idx), result in sorted(results.items()):
+        print('{:11.2f}  {:5d}  {:5d}  {:4d}  {:3d}  {:4d}  {:5d}  {:10.1f}  {:18.0f}'.format(
+            temperature, order_idx, result['games'], result['blue_wins'], result['red_wins'],
+            result['draws'], result['errors'], result['mean_turns'], result['mean_prompt_tokens']))
@@ -0,0 +1,57 @@
+import pytest
+
+from llm_pilot.action_parser import MAX_MOVE, MAX_TURN, action_end, parse_action
+
+
+@pytest.mark.parametrize('text, kind, value', [
+    ('Turn left 30 degrees.', 'turn', -30.0),
+    ('Action: turn right 45', 'turn', 45.0),
+    ('Rotate counter-clockwise by 15 deg', 'turn', -15.0),
+    ('turn left -20 degrees', 'turn', 20.0),
+    ('turn right 90 degrees', 'turn', MAX_TURN),
+    ('move forward 50 m', 'move', 50.0),
+    ('move back 20 meters', 'move', -20.0),
+    ('I will advance 0.04 km toward the grove.', 'move', 40.0),
+    ('move forward 2.5m', 'move', 2.5),
+    ('move forward 100 ft', 'move', 30.48),
+    ('move forward 0.5 km', 'move', MAX_MOVE),
+    ('Fire!', 'fire', 0.0),
+    ('hold your fire', 'unknown', 0.0),
+    ('hold position', 'unknown', 0.0),
+])
+def test_parse_action(text, kind, value):
+    action = parse_action(text)
+    assert action.kind == kind
+    assert action.value == pytest.approx(value)
+
+
+def test_turning_takes_precedence_over_moving_and_firing():
+    assert parse_action('move forward, then turn left 10 degrees and fire').kind == 'turn'
+    assert parse_action('fire, then move forward 10 m').kind == 'move'
+
+
+def test_numbers_are_not_split():
+    # '25th' is no quantity, so the default magnitude applies instead of a 2 degree turn
+    assert parse_action('turn left 25th').magnitude != 2.0
+    assert parse_action('turn left 25 degrees').magnitude == 25.0
+    assert parse_action('move forward 50.').magnitude == 50.0
+
+
+def test_canonical_round_trip():
+    for text in ('turn left 30 degrees', 'move back 20 m', 'fire'):
+        action = parse_action(text)
+        assert parse_action(action.canonical()) == action
+
+
+@pytest.mark.parametrize('text, end', [
+    ('move forward 5', None), # may still become 50
+    ('move forward 0.5 km', None), # the period is part of the number
+    ('move forward 0.5 km. Then', 20),
+    ('I see the enemy. Fire! Then', 22),
+    ('turn left 20\nbecause', 12),
+    ('hold on. Wait', None),
+])
+def test_action_end(text, end):
+    assert action_end(text) == end
+    if end is not None:
+        assert parse_action(text[:end]).kind != 'unknown'
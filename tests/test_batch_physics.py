@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from llm_pilot import SimulationBoard
+from llm_pilot.batch_physics import (ACTION_FIRE, ACTION_IDLE, ACTION_MOVE, ACTION_TURN, BLUE, DRAW, FIRE_HIT,
+                                     FIRE_MISS, FIRE_NONE, FIRE_SHORT, NO_WINNER, RED, BatchWorld)
+
+
+def duel(distance, blue_heading=180.0, red_heading=0.0):
+    # one board, blue north of red on the y axis
+    return BatchWorld(pos=[[[0.0, distance/2], [0.0, -distance/2]]], heading=[[blue_heading, red_heading]],
+                      team=[BLUE, RED], grove_xy=np.zeros((1, 0, 2)), grove_r=np.zeros((1, 0)))
+
+
+def test_hit_within_range_wins():
+    world = duel(300)
+    outcome = world.step([[ACTION_FIRE, ACTION_IDLE]], [[0, 0]])
+    assert outcome.tolist() == [[FIRE_HIT, FIRE_NONE]]
+    assert world.alive.tolist() == [[True, False]]
+    assert world.winner.tolist() == [BLUE]
+    # decided boards are left alone
+    world.step([[ACTION_MOVE, ACTION_MOVE]], [[50, 50]])
+    assert world.pos[0, 0].tolist() == [0.0, 150.0]
+    assert world.step_num.tolist() == [1]
+
+
+@pytest.mark.parametrize('distance, blue_heading, expected', [
+    (600, 180.0, FIRE_SHORT), # lined up but out of range
+    (300, 90.0, FIRE_MISS), # in range but facing away
+])
+def test_shots_that_do_not_hit(distance, blue_heading, expected):
+    world = duel(distance, blue_heading)
+    assert world.step([[ACTION_FIRE, ACTION_IDLE]], [[0, 0]]).tolist() == [[expected, FIRE_NONE]]
+    assert world.winner.tolist() == [NO_WINNER]
+
+
+def test_simultaneous_hits_are_a_draw():
+    world = duel(300)
+    world.step([[ACTION_FIRE, ACTION_FIRE]], [[0, 0]])
+    assert world.winner.tolist() == [DRAW]
+
+
+def test_turns_and_moves_are_clamped():
+    world = duel(300)
+    world.step([[ACTION_TURN, ACTION_MOVE]], [[-90, 80]])
+    assert world.heading[0].tolist() == [135.0, 0.0]
+    assert world.pos[0, 1] == pytest.approx([0.0, -100.0])
+
+
+def test_tank_driving_into_the_river_loses():
+    world = BatchWorld(pos=[[[0.0, 480.0], [0.0, -300.0]]], heading=[[0.0, 0.0]], team=[BLUE, RED],
+                       grove_xy=np.zeros((1, 0, 2)), grove_r=np.zeros((1, 0)))
+    world.step([[ACTION_MOVE, ACTION_IDLE]], [[50, 0]])
+    assert world.winner.tolist() == [RED]
+
+
+def test_from_boards_pads_groves(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    boards = [SimulationBoard('a', 'b', seed=seed, render_every=0, write_trace=False, keep_files=False,
+                              backend='mock', n_grove=n_grove) for seed, n_grove in [(1, 0), (2, 4)]]
+    world = BatchWorld.from_boards(boards)
+    assert world.grove_r.shape == (2, 4)
+    assert world.grove_mask.tolist() == [[False]*4, [True]*4]
+    assert world.grove_xy[1].tolist() == boards[1].grove_xy
+    assert world.pos.tolist() == [[list(tank.loc_xy) for tank in board.tanks] for board in boards]
+    # a board without groves never conceals its tanks
+    world.step(np.full((2, 2), ACTION_TURN), np.full((2, 2), 10.0))
+    assert not world.hidden[0].any()
+
+
+def test_from_boards_without_any_groves(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    board = SimulationBoard('a', 'b', seed=1, render_every=0, write_trace=False, keep_files=False, backend='mock',
+                            n_grove=0, n_blue=2, n_red=2)
+    world = BatchWorld.from_boards([board])
+    assert world.grove_r.shape == (1, 0)
+    assert world.team.tolist() == [[BLUE, BLUE, RED, RED]]
+    assert world.visibility().shape == (1, 4, 4)
+    world.step(np.full((1, 4), ACTION_MOVE), np.full((1, 4), 50.0))
+    assert not world.hidden.any()
@@ -0,0 +1,68 @@
+import os
+
+from llm_pilot.batch_physics import ACTION_FIRE, ACTION_MOVE, FIRE_HIT
+from llm_pilot.game_trace import GAME_BLUE_VICTORY, NO_ACTOR, TraceReader, TraceWriter
+
+HEADER = {'seed': 3, 'orders': ['Advance.', 'Hold.'], 'grove_xy': [[0.0, 0.0]], 'grove_r': [60.0]}
+
+
+def write_game(path):
+    writer = TraceWriter(path, HEADER)
+    writer.write(0, NO_ACTOR, '', [(0.0, 490.0, 180.0, False), (0.0, -490.0, 0.0, False)])
+    writer.write(1, 0, 'move forward 50 m', [(0.0, 440.0, 180.0, False), (0.0, -490.0, 0.0, False)],
+                 latency=0.5, prompt_tokens=120, completion_tokens=5)
+    writer.write(2, 1, 'Fire!', [(0.0, 440.0, 180.0, True, False), (0.0, -490.0, 0.0, False, True)],
+                 fire=FIRE_HIT, game_end=GAME_BLUE_VICTORY)
+    return writer
+
+
+def read_all(path):
+    reader = TraceReader(path)
+    steps = list(reader)
+    reader.close()
+    return steps
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    write_game(path).close()
+    reader = TraceReader(path)
+    assert reader.header == HEADER
+    assert len(reader) == 3
+    first, move, shot = reader
+    assert first.actor == NO_ACTOR and first.action == ''
+    assert move.kind == ACTION_MOVE and move.value == 50.0 and move.prompt_tokens == 120
+    assert move.latency == 0.5 and move.completion_tokens == 5
+    assert move.tanks[0].y == 440.0 and move.tanks[0].alive
+    assert shot.kind == ACTION_FIRE and shot.fire == FIRE_HIT and shot.game_end == GAME_BLUE_VICTORY
+    assert shot.tanks[0].hidden and not shot.tanks[0].alive
+    assert reader[-1] == shot
+    columns = reader.columns()
+    assert columns['xy'].shape == (3, 2, 2)
+    assert columns['alive'].tolist() == [[True, True], [True, True], [False, True]]
+    reader.close()
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    write_game(path).close()
+    expected = read_all(path)
+    os.remove(path + '.idx')
+    assert read_all(path) == expected
+
+
+def test_reopen_drops_partial_record_and_appends(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    writer = write_game(path)
+    writer.close()
+    with open(path, 'ab') as f:
+        f.write(b'\x40\x00\x00\x00partial') # a record cut short by a crash
+    assert len(read_all(path)) == 3
+    writer = TraceWriter.reopen(path)
+    writer.write(3, 0, 'turn left 10 degrees', [(0.0, 440.0, 170.0, False), (0.0, -490.0, 0.0, False)])
+    writer.close()
+    reader = TraceReader(path)
+    assert len(reader) == 4
+    assert reader[3].action == 'turn left 10 degrees' and reader[3].value == -10.0
+    assert reader[2].action == 'Fire!'
+    reader.close()
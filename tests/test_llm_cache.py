@@ -0,0 +1,74 @@
+import pytest
+
+from llm_pilot.action_parser import action_end
+from llm_pilot.backends import build_lm, stream_until
+from llm_pilot.llm_cache import CacheMissError, CachedLM, ResponseCache
+from llm_pilot.metrics import MetricsRegistry
+
+
+class EchoLM:
+    # stand-in LM answering with the prompt in upper case and counting its calls
+    def __init__(self) -> None:
+        self.kwargs = {'model': 'echo', 'temperature': 0.0, 'max_tokens': 150, 'n': 1}
+        self.calls = 0
+
+    def __call__(self, prompt, only_completed=True, return_sorted=False, **kwargs):
+        self.calls += 1
+        return [prompt.upper()]
+
+
+def test_cached_lm_serves_repeats(tmp_path):
+    lm = EchoLM()
+    cached = CachedLM(lm, ResponseCache(str(tmp_path / 'cache.sqlite')))
+    assert cached('move') == ['MOVE']
+    assert cached('move') == ['MOVE']
+    assert cached('move', temperature=0.5) == ['MOVE']
+    assert lm.calls == 2
+    assert cached.cache.hits == 1
+
+
+def test_cache_hits_are_not_counted_as_lm_calls(tmp_path):
+    metrics = MetricsRegistry()
+    lm, _ = build_lm('mock', 0.7, metrics, cache=ResponseCache(str(tmp_path / 'cache.sqlite')))
+    assert lm('Directive: attack') == lm('Directive: attack')
+    assert metrics.value('llm_calls_total') == 1
+    assert metrics.value('llm_cache_hits_total') == 1
+    assert metrics.value('llm_cache_misses_total') == 1
+    assert metrics.histograms[metrics._key('llm_call_seconds', {})].count == 1
+
+
+def test_streamed_and_whole_completions_are_kept_apart(tmp_path):
+    lm = EchoLM()
+    cached = CachedLM(lm, ResponseCache(str(tmp_path / 'cache.sqlite')))
+    cached('fire!')
+    with stream_until(action_end):
+        cached('fire!')
+        cached('fire!')
+    assert lm.calls == 2
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), max_bytes=300)
+    keys = [cache.make_key('prompt {}'.format(n), {'model': 'echo'}) for n in range(4)]
+    # every entry is 100 bytes (prompt plus JSON completions), so three fit
+    for n, key in enumerate(keys[:3]):
+        cache.put(key, 'prompt {}'.format(n), {'model': 'echo'}, ['x'*(100 - 8 - 4)])
+    assert len(cache) == 3
+    assert cache.get(keys[0]) is not None # now the most recently used
+    cache.put(keys[3], 'prompt 3', {'model': 'echo'}, ['x'*(100 - 8 - 4)])
+    assert len(cache) == 3
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[3]) is not None
+    assert cache.total_bytes <= 300
+
+
+def test_replay_only(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    CachedLM(EchoLM(), ResponseCache(path))('turn left')
+    lm = EchoLM()
+    replay = CachedLM(lm, ResponseCache(path, replay_only=True))
+    assert replay('turn left') == ['TURN LEFT']
+    with pytest.raises(CacheMissError):
+        replay('turn right')
+    assert lm.calls == 0
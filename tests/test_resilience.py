@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from llm_pilot.backends import MockServerError
+from llm_pilot.metrics import MetricsRegistry
+from llm_pilot.resilience import GameTimeoutError, ResilientLM, RetryPolicy, TokenBucket
+
+
+class FlakyLM:
+    # fails with the given errors before answering
+    def __init__(self, errors) -> None:
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, prompt, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return ['answer to ' + prompt]
+
+
+def test_transient_errors_are_retried():
+    metrics = MetricsRegistry()
+    lm = FlakyLM([MockServerError(), MockServerError(http_status=429)])
+    resilient = ResilientLM(lm, RetryPolicy(base_delay=0.001, max_delay=0.01, seed=0), metrics=metrics)
+    assert resilient('hello') == ['answer to hello']
+    assert lm.calls == 3
+    assert metrics.value('llm_retries_total', status=503) == 1
+    assert metrics.value('llm_retries_total', status=429) == 1
+
+
+def test_retries_stop_after_max_attempts():
+    lm = FlakyLM([MockServerError()]*5)
+    resilient = ResilientLM(lm, RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01, seed=0))
+    with pytest.raises(MockServerError):
+        resilient('hello')
+    assert lm.calls == 3
+
+
+def test_other_errors_are_not_retried():
+    lm = FlakyLM([MockServerError(http_status=400)])
+    with pytest.raises(MockServerError):
+        ResilientLM(lm, RetryPolicy(base_delay=0.001, seed=0))('hello')
+    assert lm.calls == 1
+
+
+def test_backoff_grows_and_honours_retry_after():
+    policy = RetryPolicy(base_delay=1.0, max_delay=8.0, seed=0)
+    for attempt in range(6):
+        assert 0 <= policy.backoff(attempt) <= min(8.0, 2.0**attempt)
+    err = MockServerError(http_status=429)
+    err.headers = {'retry-after': '5'}
+    assert policy.backoff(0, err) == 5.0
+
+
+def test_deadline_stops_retries():
+    lm = FlakyLM([MockServerError()])
+    resilient = ResilientLM(lm, RetryPolicy(base_delay=10.0, max_delay=10.0, seed=0),
+                            deadline=time.monotonic() + 0.5)
+    with pytest.raises(GameTimeoutError):
+        resilient('hello')
+    assert lm.calls == 1
+    resilient.deadline = time.monotonic() - 1
+    with pytest.raises(GameTimeoutError):
+        resilient('hello')
+    assert lm.calls == 1
+
+
+def test_token_bucket_paces_calls():
+    bucket = TokenBucket(rate=50.0, capacity=2)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    start = time.monotonic()
+    waited = bucket.acquire()
+    assert waited > 0
+    assert time.monotonic() - start >= 0.015
+
+
+@pytest.mark.parametrize('rate, capacity', [(0, 1), (-1.0, 1), (1.0, 0), (1.0, 0.5)])
+def test_token_bucket_rejects_bad_settings(rate, capacity):
+    with pytest.raises(ValueError):
+        TokenBucket(rate=rate, capacity=capacity)
+
+
+def test_token_bucket_rejects_requests_over_capacity():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1.0, capacity=2).acquire(3)
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from llm_pilot import SimulationBoard, explore_actions
+
+ORDER = 'Advance with care and fire only when you have a clear shot.'
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # game folders go to a scratch directory
+    monkeypatch.chdir(tmp_path)
+
+
+def board(**board_kwargs):
+    board_kwargs.setdefault('write_trace', False)
+    return SimulationBoard(ORDER, ORDER, seed=4, render_every=0, backend='mock', **board_kwargs)
+
+
+def transcripts(board):
+    return [[t.text for t in tank.transcript.turns] for tank in board.tanks]
+
+
+def test_restore_undoes_later_steps():
+    played = board()
+    played.play_game(n_turns=2, verbose=False)
+    state = played.snapshot()
+    before = (played.tank_states(), transcripts(played), played.step_num, played.turns_played)
+    played.update_board('blue', 'move forward 50 m')
+    played.update_board('red', 'turn left 45 degrees')
+    assert played.tank_states() != before[0]
+    played.restore(state)
+    assert (played.tank_states(), transcripts(played), played.step_num, played.turns_played) == before
+
+
+def test_boards_writing_a_trace_cannot_be_restored():
+    traced = board(write_trace=True)
+    with pytest.raises(ValueError):
+        traced.restore(traced.snapshot())
+    with pytest.raises(ValueError):
+        traced.fork(write_trace=True)
+    traced.close()
+
+
+def test_fork_continues_like_the_original():
+    full = board()
+    full.play_game(n_turns=8, verbose=False)
+    played = board()
+    played.play_game(n_turns=3, verbose=False)
+    fork = played.fork()
+    assert os.path.dirname(fork.save_folder) == played.save_folder
+    fork.play_game(n_turns=8, verbose=False)
+    assert fork.tank_states() == full.tank_states()
+    assert transcripts(fork) == transcripts(full)
+    # the original stays where it was
+    assert played.turns_played == 3
+
+
+def test_fork_overrides_settings():
+    played = board()
+    played.play_game(n_turns=2, verbose=False)
+    fork = played.fork(temperature=1.0)
+    assert fork.temperature == 1.0
+    assert played.temperature != 1.0
+    assert fork.tank_states() == played.tank_states()
+
+
+@pytest.mark.parametrize('board_kwargs', [{}, {'n_blue': 2, 'n_red': 2}])
+def test_explore_actions_plays_each_candidate(board_kwargs):
+    played = board(**board_kwargs)
+    played.play_game(n_turns=2, verbose=False)
+    before = played.tank_states()
+    tank = played.next_actors()[0]
+    candidates = ['fire', 'turn left 45 degrees', 'move backward 20 m']
+    results = explore_actions(played, candidates, n_turns=2)
+    assert played.tank_states() == before
+    assert [result['branch']['actions'][tank.name] for result in results] == candidates
+    for candidate, result in zip(candidates, results):
+        fork = result['board']
+        assert fork.tanks[tank.index].transcript.turns[len(tank.transcript.turns)].action == candidate
+        assert result['turns'] <= 2
+        assert result['outcome'] in ('blue', 'red', 'draw')
+    # in team games the other tanks of the step play the same actions in every branch
+    shared = [{name: action for name, action in result['branch']['actions'].items() if name != tank.name}
+              for result in results]
+    assert all(actions == shared[0] for actions in shared)
+    assert len(shared[0]) == len(played.next_actors()) - 1
@@ -0,0 +1,158 @@
+import os
+
+import dspy
+import pytest
+
+from llm_pilot import SimulationBoard, TokenBucket, TraceReader
+from llm_pilot.backends import BACKENDS, MockPilotLM
+
+ORDER = 'Advance with care and fire only when you have a clear shot.'
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # game folders go to a scratch directory
+    monkeypatch.chdir(tmp_path)
+
+
+def play(n_turns, seed=4, **board_kwargs):
+    board_kwargs.setdefault('backend', 'mock')
+    board = SimulationBoard(ORDER, ORDER, seed=seed, render_every=0, **board_kwargs)
+    board.play_game(n_turns=n_turns, verbose=False)
+    return board
+
+
+def trace_of(board):
+    reader = TraceReader(os.path.join(board.save_folder, 'trace.bin'))
+    steps = [(step.step, step.actor, step.action, step.tanks, step.game_end) for step in reader]
+    reader.close()
+    return steps
+
+
+@pytest.mark.parametrize('board_kwargs', [{}, {'n_blue': 2, 'n_red': 2}])
+def test_replay_rebuilds_the_game(board_kwargs):
+    board = play(12, **board_kwargs)
+    trace_path = os.path.join(board.save_folder, 'trace.bin')
+    replayed = SimulationBoard.replay(trace_path)
+    assert replayed.save_folder is None
+    assert replayed.tank_states() == board.tank_states()
+    assert replayed.game_end == board.game_end
+    assert replayed.step_num == board.step_num
+    for tank, replayed_tank in zip(board.tanks, replayed.tanks):
+        assert [t.text for t in replayed_tank.transcript.turns] == [t.text for t in tank.transcript.turns]
+    # any earlier step comes back as recorded
+    reader = TraceReader(trace_path)
+    middle = reader[len(reader)//2]
+    reader.close()
+    assert SimulationBoard.replay(trace_path, step=middle.step).tank_states() == [tuple(t) for t in middle.tanks]
+
+
+def test_resume_continues_like_an_uninterrupted_game():
+    full = play(10)
+    interrupted = play(4)
+    resumed = SimulationBoard.resume(os.path.join(interrupted.save_folder, 'trace.bin'), render_every=0,
+                                     backend='mock')
+    resumed.play_game(n_turns=10, verbose=False)
+    assert trace_of(resumed) == trace_of(full)
+    assert resumed.tank_states() == full.tank_states()
+
+
+def test_scripted_tanks_each_follow_the_script():
+    # every tank keeps its own place in the script, so team games replay the same way every time
+    games = [play(6, seed=3, backend='scripted', n_blue=3, n_red=3) for _ in range(3)]
+    assert len(set(repr(board.tank_states()) for board in games)) == 1
+    script = ['move forward 50 m', 'turn left 30 degrees', 'fire']
+    for tank in games[0].tanks:
+        actions = [t.action for t in tank.transcript.turns]
+        assert actions == [script[i % 3] for i in range(len(actions))]
+
+
+class WholeReplyLM(MockPilotLM):
+    # a backend that cannot stream: replies always come back whole
+    def generate(self, completion, max_tokens, stop) -> str:
+        return completion
+
+
+@pytest.mark.parametrize('backend', ['mock', 'whole'])
+def test_ask_pilot_keeps_the_first_action(monkeypatch, backend):
+    reply = 'fire. Then I will move forward 50 m and turn left,' + ' and then'*40
+    monkeypatch.setitem(BACKENDS, 'whole', lambda model, temperature, **kwargs: WholeReplyLM(
+        temperature=temperature, policy=lambda observation, rng, header: reply, **kwargs))
+    monkeypatch.setitem(BACKENDS, 'mock', lambda model, temperature, **kwargs: MockPilotLM(
+        temperature=temperature, policy=lambda observation, rng, header: reply, **kwargs))
+    board = SimulationBoard(ORDER, ORDER, seed=4, render_every=0, backend=backend, write_trace=False,
+                            keep_files=False)
+    with dspy.settings.context(lm=board.lm):
+        action, _, _ = board.ask_pilot(board.tanks[0])
+        debrief, _, _ = board.ask_pilot(board.tanks[0], debrief=True)
+    assert action == 'fire.'
+    assert debrief.strip() == reply[:100].strip()
+
+
+def test_time_to_action_leaves_out_rate_limiter_waits():
+    board = play(3, n_blue=2, n_red=2, rate_limiter=TokenBucket(rate=20.0, capacity=1))
+    histograms = board.metrics.histograms
+    time_to_action = histograms[board.metrics._key('pilot_time_to_action_seconds', {})]
+    waits = histograms[board.metrics._key('rate_limit_wait_seconds', {})]
+    assert time_to_action.count == sum(len(tank.transcript.turns) for tank in board.tanks)
+    assert waits.sum > 0.5
+    assert time_to_action.sum < waits.sum/4
+
+
+def place(board, *tanks):
+    # put the tanks at (x, y, heading), in board order
+    for tank, (x, y, heading) in zip(board.tanks, tanks):
+        tank.loc_xy = [x, y]
+        tank.heading = heading
+
+
+def resolve(board, *actions):
+    return board.resolve_actions([(tank, action, 0.0, 0, 0) for tank, action in zip(board.tanks, actions)])
+
+
+def simultaneous_board(**board_kwargs):
+    return SimulationBoard(ORDER, ORDER, seed=4, render_every=0, write_trace=False, keep_files=False, backend='mock',
+                           n_grove=0, simultaneous=True, **board_kwargs)
+
+
+def test_one_on_one_games_alternate_unless_asked():
+    board = SimulationBoard(ORDER, ORDER, seed=4, render_every=0, write_trace=False, keep_files=False, backend='mock')
+    assert board.next_actors() == [board.blue_tank]
+    board.update_board('blue', 'turn left 10 degrees')
+    assert board.next_actors() == [board.red_tank]
+
+
+def test_shots_on_the_same_step_are_a_draw():
+    board = simultaneous_board()
+    place(board, (0, 150, 180), (0, -150, 0))
+    assert board.next_actors() == board.tanks
+    assert resolve(board, 'fire', 'fire') == 'Draw! Both sides have been destroyed.'
+    assert not any(tank.alive for tank in board.tanks)
+    assert board.next_actors() == []
+    assert all(tank.transcript.turns[-1].fired for tank in board.tanks)
+
+
+def test_moves_are_resolved_before_shots():
+    board = simultaneous_board()
+    place(board, (0, 220, 180), (0, -220, 0))
+    # 440 m apart is out of range, but blue closes to 390 m in the same step
+    assert resolve(board, 'move forward 50 m', 'fire') == 'Red victory!'
+    assert not board.blue_tank.alive
+
+
+def test_both_sides_sinking_is_a_draw():
+    board = simultaneous_board()
+    place(board, (0, 480, 0), (0, -480, 180))
+    assert resolve(board, 'move forward 50 m', 'move forward 50 m') == 'Draw! Both sides have been destroyed.'
+    assert all('sink in the murky depths' in ''.join(tank.transcript.turns[-1].events) for tank in board.tanks)
+
+
+def test_team_games_go_on_after_a_tank_is_destroyed():
+    board = simultaneous_board(n_blue=2, n_red=2)
+    place(board, (-300, 150, 180), (300, 450, 90), (-300, -150, 0), (300, -450, 90))
+    assert resolve(board, 'turn left 10 degrees', 'turn left 10 degrees', 'fire', 'move forward 10 m') == 'Continue'
+    destroyed = board.tanks[0]
+    assert not destroyed.alive
+    assert 'hit by an enemy shot and destroyed' in ''.join(destroyed.transcript.turns[-1].events)
+    assert board.next_actors() == board.tanks[1:]
+    assert 'strikes an enemy tank and destroys it' in ''.join(board.tanks[2].transcript.turns[-1].events)
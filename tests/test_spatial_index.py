@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from llm_pilot import SimulationBoard
+from llm_pilot.batch_physics import BatchWorld
+from llm_pilot.spatial_index import KIND_GROVE, KIND_ROCK, ObstacleGrid
+
+
+def random_map(n, seed):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-500, 500, (n, 2))
+    r = rng.uniform(5, 40, n)
+    kind = rng.choice([KIND_GROVE, KIND_ROCK], n)
+    return xy, r, kind
+
+
+def brute_crossing(xy, r, p0, p1):
+    # circles cut by the segment p0-p1, leaving out those containing either end
+    d = p1 - p0
+    t = np.clip(((xy - p0) @ d)/max(d @ d, 1e-12), 0, 1)
+    closest = np.hypot(*(p0 + t[:, None]*d - xy).T)
+    return (closest < r) & (np.hypot(*(xy - p0).T) > r) & (np.hypot(*(xy - p1).T) > r)
+
+
+@pytest.mark.parametrize('n', [10, 300]) # scanned, and looked up in cells
+def test_queries_match_brute_force(n):
+    xy, r, kind = random_map(n, seed=n)
+    grid = ObstacleGrid(xy, r, kind)
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        center = rng.uniform(-500, 500, 2)
+        heading = rng.uniform(0, 360)
+        dist = np.hypot(*(xy - center).T)
+        idx, near_dist = grid.near(center, 150.0)
+        assert idx.tolist() == np.flatnonzero(dist - r <= 150.0).tolist()
+        assert np.allclose(near_dist, dist[idx])
+        idx, _, _ = grid.in_view(center, heading, 300.0, 90.0)
+        angle = 90 - np.rad2deg(np.arctan2(xy[:, 1] - center[1], xy[:, 0] - center[0]))
+        assert idx.tolist() == np.flatnonzero((dist - r <= 300.0) & (np.abs(heading - angle) <= 90.0)).tolist()
+        end = rng.uniform(-500, 500, 2)
+        crossing = brute_crossing(xy, r, center, end)
+        assert grid.blocking(center, end).tolist() == np.flatnonzero(crossing & (kind == KIND_ROCK)).tolist()
+        assert grid.blocking(center, end, kinds=(KIND_GROVE, KIND_ROCK)).tolist() == np.flatnonzero(crossing).tolist()
+        assert grid.line_of_sight(center, end) == (not np.any(crossing & (kind == KIND_ROCK)))
+        targets = rng.uniform(-500, 500, (8, 2))
+        expected = [not np.any(brute_crossing(xy, r, center, t) & (kind == KIND_ROCK)) for t in targets]
+        assert grid.lines_clear(center, targets).tolist() == expected
+
+
+def test_empty_map():
+    grid = ObstacleGrid([], [])
+    assert len(grid.near([0, 0], 100.0)[0]) == 0
+    assert grid.line_of_sight([0, 0], [100, 100])
+    assert grid.lines_clear([0, 0], [[1, 1], [2, 2]]).tolist() == [True, True]
+
+
+def test_obstacles_stay_inside_off_centre_boards(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    limits = (200, 1200, -1000, 0)
+    board = SimulationBoard('a', 'b', seed=2, render_every=0, write_trace=False, keep_files=False, backend='mock',
+                            board_limits=limits, n_grove=20, n_rocks=20)
+    xy = np.array(board.grove_xy + board.rock_xy)
+    assert ((xy >= [300, -900]) & (xy <= [1100, -100])).all()
+    world = BatchWorld.random(8, n_grove=20, board_limits=limits, rng=0)
+    assert ((world.grove_xy >= [300, -900]) & (world.grove_xy <= [1100, -100])).all()
@@ -0,0 +1,53 @@
+import pytest
+
+from llm_pilot.captain import captain_orders
+from llm_pilot.cli import parse_args
+from llm_pilot.metrics import MetricsRegistry
+from llm_pilot.tournament import run_tournament
+
+ORDERS = [('Advance with care and fire only when you have a clear shot.',
+           'Hold your ground and fire at anything that moves.')]
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # game folders and the checkpoint go to a scratch directory
+    monkeypatch.chdir(tmp_path)
+
+
+def tournament(n_turns=4, **kwargs):
+    return run_tournament(ORDERS, [0.7], range(2), n_turns=n_turns, max_workers=2, checkpoint='checkpoint.jsonl',
+                          backend='mock', render_every=0, **kwargs)
+
+
+def test_checkpoint_skips_finished_games(capsys):
+    first = tournament()
+    capsys.readouterr()
+    second = tournament()
+    assert 'Skipping 2 games' in capsys.readouterr().out
+    assert sorted(second[(0.7, 0)]['turns']) == sorted(first[(0.7, 0)]['turns'])
+
+
+@pytest.mark.parametrize('changed', [{'n_turns': 6}, {'n_blue': 2, 'n_red': 2}, {'backend': 'scripted'}])
+def test_checkpoint_refuses_other_settings(changed):
+    tournament()
+    settings = {'n_turns': 4, 'backend': 'mock', **changed}
+    with pytest.raises(ValueError, match='other settings'):
+        run_tournament(ORDERS, [0.7], range(2), max_workers=2, checkpoint='checkpoint.jsonl', render_every=0,
+                       **settings)
+
+
+def test_captain_order_variants_are_generated_apart():
+    metrics = MetricsRegistry()
+    first = captain_orders('mock', metrics=metrics, temperature=0.4, variant=0)
+    assert captain_orders('mock', metrics=metrics, temperature=0.4, variant=0) is first
+    captain_orders('mock', metrics=metrics, temperature=0.4, variant=1)
+    assert metrics.value('llm_calls_total') == 4 # blue and red orders of each variant
+
+
+def test_cli_orders_grid():
+    args = parse_args(['--captain-temperatures', '0.2', '0.9', '--order-pairs', '3'])
+    assert args.captain_temperatures == [0.2, 0.9]
+    assert args.order_pairs == 3
+    with pytest.raises(SystemExit):
+        parse_args(['--order-pairs', '0'])